@@ -1,12 +1,24 @@
+import asyncio
 import logging
+import os
 import typing as t
-from os.path import splitext
 
-from discord import Embed, Message, NotFound
+import aiohttp
+from discord import Embed, Message
+from discord.ext import commands
 from discord.ext.commands import Cog
 
+from utils.archives import find_archive_problems
+from utils.attachments import PolicyRegistry, find_disguised_executables
+from utils.blocklist import HashBlocklist, find_blocklisted, hash_url
+from utils.enforcement import Enforcer
+from utils.privileges import is_attachment_exempt
+
 log = logging.getLogger(__name__)
 
+policy_path = os.environ.get("attachment_policy", "attachment_policy.json")
+blocklist_path = os.environ.get("hash_blocklist", "hash_blocklist.db")
+
 PY_EMBED_DESCRIPTION = (
     "It looks like you tried to attach a Python file - "
     "please use a code-pasting service such as pastebin or hastebin"
@@ -28,12 +40,25 @@ DISALLOWED_EMBED_DESCRIPTION = (
     "Feel free to ask in {meta_channel_mention} if you think this is a mistake."
 )
 
-allowed_roles = [
-    813670380707381249,
-    813668893272965130,
-    813669798499188746,
-    813669347511238687,
-]
+DISGUISED_EMBED_DESCRIPTION = (
+    "It looks like you tried to attach an executable disguised as another file type ({disguised_str}). "
+    "Feel free to ask in {meta_channel_mention} if you think this is a mistake."
+)
+
+ARCHIVE_EMBED_DESCRIPTION = (
+    "It looks like you tried to attach an archive with content that we do not allow ({archive_str}). "
+    "Feel free to ask in {meta_channel_mention} if you think this is a mistake."
+)
+
+BLOCKLISTED_EMBED_DESCRIPTION = (
+    "It looks like you tried to attach a file that is known to be malicious ({blocklisted_str}). "
+    "Feel free to ask in {meta_channel_mention} if you think this is a mistake."
+)
+
+# Keep the warning short when an archive is full of blocked files
+MAX_LISTED_PROBLEMS = 10
+
+cmd_channel_id = 799133475268722708
 
 
 class AntiMalware(Cog):
@@ -41,38 +66,94 @@ class AntiMalware(Cog):
 
     def __init__(self, bot):
         self.bot = bot
-
-    def _get_whitelisted_file_formats(self) -> list:
-        """Get the file formats currently on the whitelist."""
-        return ["png", "jpg"]
+        self.session = None
+        self.policies = PolicyRegistry(policy_path)
+        self.policies.load()
+        self.blocklist = HashBlocklist(blocklist_path)
+        self.loading = self.bot.loop.create_task(self.blocklist.load())
+        self.enforcer = Enforcer()
+
+    def cog_unload(self):
+        if self.session is not None:
+            self.bot.loop.create_task(self.session.close())
+        self.blocklist.close()
+        self.enforcer.close()
+
+    def get_session(self) -> aiohttp.ClientSession:
+        """Return the session used to sniff attachments, creating it if needed."""
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=5))
+        return self.session
+
+    def _get_whitelisted_file_formats(self, message: Message) -> t.List[str]:
+        """Get the file formats currently on the whitelist of the message's guild."""
+        return sorted(self.policies.get(message.guild).allowed)
 
     def _get_disallowed_extensions(self, message: Message) -> t.Iterable[str]:
         """Get an iterable containing all the disallowed extensions of attachments."""
-        file_extensions = {
-            splitext(attachment.filename.lower())[1]
-            for attachment in message.attachments
-        }
-        extensions_blocked = file_extensions - set(
-            [
-                "py",
-                "txt",
-                "js",
-                "cpp",
-                "html",
-                "css",
-                "sh",
-                "rar",
-                "zip",
-                "go",
-                "json",
-                "7zip",
-                "go",
-                "ts",
-                "mp4",
-                "mp3",
-            ]
+        return self.policies.get(message.guild).disallowed_extensions(
+            message.attachments
         )
-        return extensions_blocked
+
+    def _cmd_channel_mention(self) -> str:
+        channel = self.bot.get_channel(cmd_channel_id)
+        return channel.mention if channel else "#bot-commands"
+
+    @commands.command(hidden=True)
+    @commands.is_owner()
+    async def reloadpolicy(self, ctx):
+        """
+        Reload the attachment policies from their file
+        """
+        try:
+            self.policies.load()
+        except (OSError, ValueError) as e:
+            return await ctx.send(f"Could not reload the attachment policies: {e}")
+        await ctx.send("Attachment policies reloaded.")
+
+    @commands.command(aliases=["blockfile"])
+    @commands.has_permissions(manage_messages=True)
+    async def blockhash(self, ctx, message: t.Optional[Message] = None, *, reason=""):
+        """
+        Add the attachments of a message to the blocklist of known-bad files
+        Reply to the message or pass its ID or link.
+        """
+        if message is None and ctx.message.reference:
+            message = ctx.message.reference.resolved
+        if not isinstance(message, Message) or not message.attachments:
+            return await ctx.send("Reply to or link a message with attachments.")
+        await self.loading
+
+        lines = []
+        for attachment in message.attachments:
+            try:
+                digest = await hash_url(self.get_session(), attachment.url)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                lines.append(f"`{attachment.filename}`: could not be downloaded ({e})")
+                continue
+            if digest is None:
+                lines.append(f"`{attachment.filename}`: too large to hash")
+            elif await self.blocklist.add(digest, ctx.author.id, reason):
+                lines.append(f"`{attachment.filename}`: blocked `{digest.hex()}`")
+            else:
+                lines.append(f"`{attachment.filename}`: already blocked")
+        await ctx.send("\n".join(lines))
+
+    @commands.command(aliases=["unblockfile"])
+    @commands.has_permissions(manage_messages=True)
+    async def unblockhash(self, ctx, digest: str):
+        """
+        Remove a SHA-256 hash from the blocklist of known-bad files
+        """
+        try:
+            digest = bytes.fromhex(digest)
+        except ValueError:
+            return await ctx.send("That is not a valid hash.")
+        await self.loading
+        if await self.blocklist.remove(digest):
+            await ctx.send("Hash removed from the blocklist.")
+        else:
+            await ctx.send("That hash is not on the blocklist.")
 
     @Cog.listener()
     async def on_message(self, message: Message) -> None:
@@ -86,10 +167,7 @@ class AntiMalware(Cog):
             return
 
         # Check if user is staff, if is, return
-        # Since we only care that roles exist to iterate over, check for the attr rather than a User/Member instance
-        if hasattr(message.author, "roles") and any(
-            role.id in allowed_roles for role in message.author.roles
-        ):
+        if is_attachment_exempt(message.author):
             return
 
         embed = Embed()
@@ -100,12 +178,51 @@ class AntiMalware(Cog):
             embed.description = PY_EMBED_DESCRIPTION
         elif ".txt" in extensions_blocked:
             # Work around Discord AutoConversion of messages longer than 2000 chars to .txt
-            cmd_channel = self.bot.get_channel(799133475268722708)
             embed.description = TXT_EMBED_DESCRIPTION.format(
-                cmd_channel_mention=cmd_channel.mention
+                cmd_channel_mention=self._cmd_channel_mention()
             )
-
-        #
+        elif extensions_blocked:
+            embed.description = DISALLOWED_EMBED_DESCRIPTION.format(
+                blocked_extensions_str=blocked_extensions_str,
+                joined_whitelist=", ".join(self._get_whitelisted_file_formats(message)),
+                meta_channel_mention=self._cmd_channel_mention(),
+            )
+        else:
+            # The extensions are fine, make sure the content is what it claims to be
+            policy = self.policies.get(message.guild)
+            session = self.get_session()
+            blocklisted, disguised, archive_problems = await asyncio.gather(
+                find_blocklisted(session, self.blocklist, message.attachments),
+                find_disguised_executables(session, message.attachments)
+                if policy.sniff
+                else asyncio.sleep(0, []),
+                find_archive_problems(session, message.attachments, policy),
+            )
+            if blocklisted:
+                blocked_extensions_str = ", ".join(blocklisted)
+                embed.description = BLOCKLISTED_EMBED_DESCRIPTION.format(
+                    blocklisted_str=blocked_extensions_str,
+                    meta_channel_mention=self._cmd_channel_mention(),
+                )
+            elif disguised:
+                blocked_extensions_str = ", ".join(
+                    f"{filename} ({kind})" for filename, kind in disguised
+                )
+                embed.description = DISGUISED_EMBED_DESCRIPTION.format(
+                    disguised_str=blocked_extensions_str,
+                    meta_channel_mention=self._cmd_channel_mention(),
+                )
+            elif archive_problems:
+                blocked_extensions_str = ", ".join(
+                    f"{filename}: {problem}"
+                    for filename, problem in archive_problems[:MAX_LISTED_PROBLEMS]
+                )
+                if len(archive_problems) > MAX_LISTED_PROBLEMS:
+                    blocked_extensions_str += ", ..."
+                embed.description = ARCHIVE_EMBED_DESCRIPTION.format(
+                    archive_str=blocked_extensions_str,
+                    meta_channel_mention=self._cmd_channel_mention(),
+                )
 
         if embed.description:
             log.info(
@@ -117,15 +234,8 @@ class AntiMalware(Cog):
                 },
             )
 
-            await message.channel.send(f"Hey {message.author.mention}!", embed=embed)
-
-            # Delete the offending message:
-            try:
-                await message.delete()
-            except NotFound:
-                log.info(
-                    f"Tried to delete message `{message.id}`, but message could not be found."
-                )
+            # Delete the offending message and warn its author, bursts are coalesced
+            self.enforcer.report(message, embed.description)
 
 
 def setup(bot) -> None:
@@ -1,9 +1,20 @@
 import asyncio
+import os
+import typing as t
 
 import discord
+import motor.motor_asyncio
 from discord.ext import commands
 from discord.ext.commands import BucketType, cooldown
 
+from utils.converters import Duration
+from utils.polls import Poll, PollEngine
+
+mongo_url = os.environ.get("mongo")
+
+cluster = motor.motor_asyncio.AsyncIOMotorClient(mongo_url)
+polls = cluster["discord"]["polls"]
+
 
 def to_emoji(c):
     base = 0x1F1E6
@@ -13,6 +24,19 @@ def to_emoji(c):
 class General(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.polls = PollEngine(bot, polls)
+        self.bot.loop.create_task(self.polls.load())
+
+    def cog_unload(self):
+        self.polls.cancel()
+
+    @commands.Cog.listener()
+    async def on_raw_reaction_add(self, payload):
+        await self.polls.on_reaction_add(payload)
+
+    @commands.Cog.listener()
+    async def on_raw_reaction_remove(self, payload):
+        await self.polls.on_reaction_remove(payload)
 
     @commands.Cog.listener()
     async def on_ready(self):
@@ -42,12 +66,13 @@ class General(commands.Cog):
         await ctx.message.delete()
         await ctx.send("**Your Suggestion Has Been Recorded**")
 
-    @commands.command(hidden=True, description="Creates a poll")
+    @commands.command(hidden=True, description="Creates a poll", aliases=["multipoll"])
     @commands.guild_only()
     @commands.has_permissions(administrator=True)
-    async def poll(self, ctx, *, question):
+    async def poll(self, ctx, closes_at: t.Optional[Duration] = None, *, question):
         """Interactively creates a poll with the following question.
-        To vote, use reactions!
+        To vote, use reactions! Everyone gets a single vote, use `multipoll` to allow more.
+        Start with a duration like `1d` or `2h30M` to close the poll automatically.
         """
 
         # a list of messages to delete when we're all done
@@ -82,13 +107,37 @@ class General(commands.Cog):
             await ctx.channel.delete_messages(messages)
         except Exception:
             pass  # oh well
-        answer = "\n".join(f"{keycap}: {content}" for keycap, content in answers)
-        e = discord.Embed(title=f"{ctx.author.name} asks: {question}", color=0x7289DA)
-        e.add_field(name="\u200b", value=f"{answer}")
-        actual_poll = await ctx.send(embed=e)
+        if not answers:
+            return await ctx.send("A poll needs at least one option.", delete_after=10)
+
+        poll = Poll(
+            message_id=0,
+            channel_id=ctx.channel.id,
+            author=ctx.author.name,
+            question=question,
+            options=answers,
+            closes_at=closes_at,
+            single_vote=ctx.invoked_with != "multipoll",
+        )
+        actual_poll = await ctx.send(embed=poll.render())
+        poll.message_id = actual_poll.id
+        await self.polls.start(poll)
         for emoji, _ in answers:
             await actual_poll.add_reaction(emoji)
 
+    @commands.command(hidden=True)
+    @commands.guild_only()
+    @commands.has_permissions(administrator=True)
+    async def closepoll(self, ctx, message_id: int):
+        """
+        Close a poll now and show its final results
+        """
+        poll = self.polls.polls.get(message_id)
+        if poll is None:
+            return await ctx.send("There is no open poll with that ID.")
+        await self.polls.close(poll)
+        await ctx.send("Poll closed.")
+
     @poll.error
     async def poll_error(self, ctx, error):
         if isinstance(error, commands.MissingRequiredArgument):
@@ -0,0 +1,57 @@
+import discord
+from discord.ext import commands
+
+from utils.privileges import INDEXES
+
+
+class Privileges(commands.Cog):
+    """
+    Keeps the privilege indexes up to date
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        # The cog may be (re)loaded after the bot is ready, when on_ready won't fire again
+        self.build_all()
+
+    def build_all(self):
+        for guild in self.bot.guilds:
+            for index in INDEXES:
+                index.build(guild)
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        self.build_all()
+        print("Privileges Cog Loaded Successfully")
+
+    @commands.Cog.listener()
+    async def on_guild_join(self, guild: discord.Guild):
+        for index in INDEXES:
+            index.build(guild)
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild: discord.Guild):
+        for index in INDEXES:
+            index.forget(guild)
+
+    @commands.Cog.listener()
+    async def on_member_update(self, before: discord.Member, after: discord.Member):
+        if before.roles != after.roles:
+            for index in INDEXES:
+                index.update(after)
+
+    @commands.Cog.listener()
+    async def on_member_remove(self, member: discord.Member):
+        for index in INDEXES:
+            index.remove(member)
+
+    @commands.Cog.listener()
+    async def on_guild_role_delete(self, role: discord.Role):
+        # Deleting a privileged role takes it away from every member at once
+        for index in INDEXES:
+            if role.id in index.role_ids:
+                index.build(role.guild)
+
+
+def setup(bot):
+    bot.add_cog(Privileges(bot))
@@ -1,20 +1,52 @@
 import os
+from io import BytesIO
+from typing import Tuple
 
 import aiohttp
 import discord
-from discord import AsyncWebhookAdapter, Webhook
+from discord import AsyncWebhookAdapter, AuditLogAction, Webhook
 from discord.ext import commands
 
+from utils.audit import AuditLogCorrelator
+from utils.diff import word_diff
+from utils.invites import InviteTracker
+
 url = os.environ.get("logs")
 colors = [""]
 
+EMBED_FIELD_LIMIT = 1024
+# Candidate invites listed for a join which can't be attributed to one, fits a field
+MAX_LISTED_INVITES = 8
+DIFF_TRUNCATED = "\n... (diff truncated - full diff attached)"
+# Combined length of edits which get diffed off the event loop
+DIFF_EXECUTOR_THRESHOLD = 1000
+
 
 class PyEvents(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.audit = AuditLogCorrelator(self.send_log)
+        self.invites = InviteTracker()
+
+    def cog_unload(self):
+        self.audit.cancel()
+        self.invites.cancel()
+
+    async def send_log(self, embed, file=None):
+        """Send `embed` (and optionally `file`) to the logging webhook in a single request."""
+        try:
+            async with aiohttp.ClientSession() as session:
+                webhook = Webhook.from_url(url, adapter=AsyncWebhookAdapter(session))
+                await webhook.send(embed=embed, file=file)
+        except Exception as e:
+            print(e)
 
     @commands.Cog.listener()
     async def on_ready(self):
+        # on_ready can fire again after a reconnect, only seed guilds we don't know yet
+        for guild in self.bot.guilds:
+            if not self.invites.is_seeded(guild):
+                await self.invites.seed(guild)
         print("PyEvents cog loaded")
 
     @commands.Cog.listener()
@@ -45,145 +77,166 @@ class PyEvents(commands.Cog):
 
             except Exception as e:
                 print(e)
+        elif before.content == after.content:
+            # Embeds getting resolved also dispatch an edit, there is no content change to log
+            return
+
         else:
-            try:
-                async with aiohttp.ClientSession() as session:
-                    webhook = Webhook.from_url(
-                        url, adapter=AsyncWebhookAdapter(session)
-                    )
-                    e = discord.Embed()
-                    e.add_field(
-                        name=f"Changes by - {after.author.name} ({after.author.id})",
-                        value=f"From -> {before.content}\n to -> {after.content}\n**[Message link]({after.jump_url})**  |"
-                        " {after.channel.mention} | {after.author.mention}",
-                        inline=False,
-                    )
-                    e.set_author(name="Log", icon_url=after.author.avatar_url)
-                    await webhook.send(embed=e)
-            except Exception as e:
-                print(e)
+            links = f"**[Message link]({after.jump_url})**  | {after.channel.mention} | {after.author.mention}"
+            limit = EMBED_FIELD_LIMIT - len(links) - len(DIFF_TRUNCATED) - 1
+            compact, full, truncated = await self.diff_edit(
+                before.content, after.content, limit
+            )
+
+            file = None
+            if truncated:
+                compact += DIFF_TRUNCATED
+                file = discord.File(BytesIO(full.encode("utf-8")), filename="edit.diff")
+
+            e = discord.Embed()
+            e.add_field(
+                name=f"Changes by - {after.author.name} ({after.author.id})",
+                value=f"{compact}\n{links}",
+                inline=False,
+            )
+            e.set_author(name="Log", icon_url=after.author.avatar_url)
+            await self.send_log(e, file=file)
+
+    async def diff_edit(
+        self, before: str, after: str, limit: int
+    ) -> Tuple[str, str, bool]:
+        """Diff an edit, in a worker thread if the message is large enough to block the loop."""
+        if len(before) + len(after) < DIFF_EXECUTOR_THRESHOLD:
+            return word_diff(before, after, limit)
+        return await self.bot.loop.run_in_executor(
+            None, word_diff, before, after, limit
+        )
 
     @commands.Cog.listener()
     async def on_member_ban(self, guild, user):
-        try:
-            async with aiohttp.ClientSession() as session:
-                webhook = Webhook.from_url(url, adapter=AsyncWebhookAdapter(session))
-                e = discord.Embed()
-                e.add_field(
-                    name=f"{user.name} ({user.id}) got banned",
-                    value="\u200b",
-                    inline=False,
-                )
-                await webhook.send(embed=e)
-        except Exception:
-            pass
+        e = discord.Embed()
+        e.add_field(
+            name=f"{user.name} ({user.id}) got banned",
+            value="\u200b",
+            inline=False,
+        )
+        await self.audit.enqueue(guild, AuditLogAction.ban, user.id, e)
 
     @commands.Cog.listener()
     async def on_invite_create(self, invite):
-        try:
-            async with aiohttp.ClientSession() as session:
-                webhook = Webhook.from_url(url, adapter=AsyncWebhookAdapter(session))
-                e = discord.Embed()
-                e.add_field(
-                    name="\u200b", value=f"**[Invite created]({invite})**", inline=False
-                )
-                e.set_author(name="Log", icon_url="https://i.imgur.com/fXUI76n.png")
-                e.set_footer(text="PyBot Logging")
-                await webhook.send(embed=e)
-        except Exception:
-            pass
+        self.invites.add(invite)
+        e = discord.Embed()
+        e.add_field(
+            name="\u200b", value=f"**[Invite created]({invite})**", inline=False
+        )
+        e.set_author(name="Log", icon_url="https://i.imgur.com/fXUI76n.png")
+        e.set_footer(text="PyBot Logging")
+        await self.send_log(e)
 
     @commands.Cog.listener()
     async def on_invite_delete(self, invite):
-        try:
-            async with aiohttp.ClientSession() as session:
-                webhook = Webhook.from_url(url, adapter=AsyncWebhookAdapter(session))
-                e = discord.Embed()
-                e.add_field(name="\u200b", value="Invite deleted", inline=False)
-                e.set_author(name="Log", icon_url="https://i.imgur.com/fXUI76n.png")
-                e.set_footer(text="PyBot Logging")
-                await webhook.send(embed=e)
-        except Exception:
-            pass
+        self.invites.remove(invite)
+        e = discord.Embed()
+        e.add_field(name="\u200b", value="Invite deleted", inline=False)
+        e.set_author(name="Log", icon_url="https://i.imgur.com/fXUI76n.png")
+        e.set_footer(text="PyBot Logging")
+        await self.send_log(e)
+
+    @staticmethod
+    def describe_invite(invite: discord.Invite) -> str:
+        inviter = (
+            f"{invite.inviter.mention} ({invite.inviter.id})"
+            if invite.inviter
+            else "Unknown"
+        )
+        return f"**[{invite.code}]({invite})** by {inviter} | {invite.uses} uses"
+
+    @commands.Cog.listener()
+    async def on_member_join(self, member):
+        invites = await self.invites.attribute(member)
+        if not invites:
+            value = "Invite could not be determined"
+        elif len(invites) == 1:
+            value = self.describe_invite(invites[0])
+        else:
+            # Several members joined at once through different invites
+            value = "Ambiguous, one of:\n" + "\n".join(
+                self.describe_invite(invite) for invite in invites[:MAX_LISTED_INVITES]
+            )
+            if len(invites) > MAX_LISTED_INVITES:
+                value += f"\n... and {len(invites) - MAX_LISTED_INVITES} more"
+
+        e = discord.Embed()
+        e.add_field(
+            name=f"{member.name} ({member.id}) joined", value=value, inline=False
+        )
+        e.set_author(name="Log", icon_url=member.avatar_url)
+        e.set_footer(text="PyBot Logging")
+        await self.send_log(e)
 
     @commands.Cog.listener()
     async def on_member_unban(self, guild, user):
-        try:
-            async with aiohttp.ClientSession() as session:
-                webhook = Webhook.from_url(url, adapter=AsyncWebhookAdapter(session))
-                e = discord.Embed()
-                e.add_field(
-                    name=f"{user.name} ({user.id}) got unbanned",
-                    value="\u200b",
-                    inline=False,
-                )
-                await webhook.send(embed=e)
-        except Exception:
-            pass
+        e = discord.Embed()
+        e.add_field(
+            name=f"{user.name} ({user.id}) got unbanned",
+            value="\u200b",
+            inline=False,
+        )
+        await self.audit.enqueue(guild, AuditLogAction.unban, user.id, e)
 
     @commands.Cog.listener()
     async def on_message_delete(self, message):
-        try:
-            async with aiohttp.ClientSession() as session:
-                webhook = Webhook.from_url(url, adapter=AsyncWebhookAdapter(session))
-                e = discord.Embed()
-                e.add_field(
-                    name=f"Message deleted of - {message.author.name} ({message.author.id})",
-                    value=f"Message -> {message.content}\n{message.author.mention} | {message.channel.mention}",
-                    inline=False,
-                )
-                e.set_author(name="Log", icon_url=message.author.avatar_url)
-                await webhook.send(embed=e)
-        except Exception:
-            pass
+        e = discord.Embed()
+        e.add_field(
+            name=f"Message deleted of - {message.author.name} ({message.author.id})",
+            value=f"Message -> {message.content}\n{message.author.mention} | {message.channel.mention}",
+            inline=False,
+        )
+        e.set_author(name="Log", icon_url=message.author.avatar_url)
+        # Self deletes have no audit-log entry, those are dispatched without an actor
+        await self.audit.enqueue(
+            message.guild,
+            AuditLogAction.message_delete,
+            message.author.id,
+            e,
+            channel_id=message.channel.id,
+        )
 
     @commands.Cog.listener()
     async def on_bulk_message_delete(self, messages):
-        try:
-            async with aiohttp.ClientSession() as session:
-                webhook = Webhook.from_url(url, adapter=AsyncWebhookAdapter(session))
-                e = discord.Embed()
-                e.add_field(
-                    name="Message Deleted in Bulk",
-                    value=f"{len(messages)} got deleted in {messages[0].channel.mention}",
-                    inline=False,
-                )
-                e.set_author(name="Log", icon_url="https://i.imgur.com/fXUI76n.png")
-                await webhook.send(embed=e)
-        except Exception as e:
-            print(e)
+        channel = messages[0].channel
+        e = discord.Embed()
+        e.add_field(
+            name="Message Deleted in Bulk",
+            value=f"{len(messages)} got deleted in {channel.mention}",
+            inline=False,
+        )
+        e.set_author(name="Log", icon_url="https://i.imgur.com/fXUI76n.png")
+        await self.audit.enqueue(
+            messages[0].guild, AuditLogAction.message_bulk_delete, channel.id, e
+        )
 
     @commands.Cog.listener()
     async def on_guild_role_create(self, role):
-        try:
-            async with aiohttp.ClientSession() as session:
-                webhook = Webhook.from_url(url, adapter=AsyncWebhookAdapter(session))
-                e = discord.Embed()
-                e.add_field(
-                    name=f"Role created -> {role.name} ({role.id})",
-                    value=f"{role.mention} | Logging",
-                    inline=False,
-                )
-                e.set_author(name="Log", icon_url="https://i.imgur.com/fXUI76n.png")
-                await webhook.send(embed=e)
-        except Exception:
-            pass
+        e = discord.Embed()
+        e.add_field(
+            name=f"Role created -> {role.name} ({role.id})",
+            value=f"{role.mention} | Logging",
+            inline=False,
+        )
+        e.set_author(name="Log", icon_url="https://i.imgur.com/fXUI76n.png")
+        await self.audit.enqueue(role.guild, AuditLogAction.role_create, role.id, e)
 
     @commands.Cog.listener()
     async def on_guild_role_delete(self, role):
-        try:
-            async with aiohttp.ClientSession() as session:
-                webhook = Webhook.from_url(url, adapter=AsyncWebhookAdapter(session))
-                e = discord.Embed()
-                e.add_field(
-                    name=f"Role deleted -> {role.name} ({role.id})",
-                    value=f"{role.mention} | Logging",
-                    inline=False,
-                )
-                e.set_author(name="Log", icon_url="https://i.imgur.com/fXUI76n.png")
-                await webhook.send(embed=e)
-        except Exception:
-            pass
+        e = discord.Embed()
+        e.add_field(
+            name=f"Role deleted -> {role.name} ({role.id})",
+            value=f"{role.mention} | Logging",
+            inline=False,
+        )
+        e.set_author(name="Log", icon_url="https://i.imgur.com/fXUI76n.png")
+        await self.audit.enqueue(role.guild, AuditLogAction.role_delete, role.id, e)
 
     @commands.Cog.listener()
     async def on_member_update(self, before, after):
@@ -1,5 +1,27 @@
+import asyncio
+import os
+import typing as t
+
+import discord
+import motor.motor_asyncio
 from discord.ext import commands
 
+from utils.cache import AsyncCache
+from utils.reaction_roles import ReactionRoleRegistry, emoji_key, render_menu
+from utils.role_batcher import RoleBatcher
+
+mongo_url = os.environ.get("mongo")
+
+cluster = motor.motor_asyncio.AsyncIOMotorClient(mongo_url)
+reaction_roles = cluster["discord"]["reaction_roles"]
+
+# Concurrent fetches of the same member share one request. Fetched members aren't kept, their
+# roles would go stale as soon as the batcher edits them
+member_cache = AsyncCache(max_size=512)
+
+# Role changes queued at once while reconciling, before waiting for them to be applied
+RECONCILE_BATCH_SIZE = 100
+
 
 class ReactionRoles(commands.Cog):
     """
@@ -8,69 +30,318 @@ class ReactionRoles(commands.Cog):
 
     def __init__(self, bot):
         self.bot = bot
+        self.registry = ReactionRoleRegistry(reaction_roles)
+        self.loading = self.bot.loop.create_task(self.registry.load())
+        # Quick clicks on several roles end up in a single edit of the member
+        self.batcher = RoleBatcher()
+        self.reconciling = asyncio.Lock()
+
+    def cog_unload(self):
+        self.batcher.close()
 
     @commands.Cog.listener()
     async def on_ready(self):
         print("Reaction role Cog Loaded Successfully")
+        await self.reconcile()
+
+    @member_cache(
+        arg_offset=1,
+        key=lambda guild, user_id: (guild.id, user_id),
+        should_cache=lambda member: False,
+    )
+    async def fetch_member(self, guild: discord.Guild, user_id: int) -> discord.Member:
+        return await guild.fetch_member(user_id)
+
+    async def resolve_member(
+        self, payload: discord.RawReactionActionEvent
+    ) -> t.Optional[discord.Member]:
+        """
+        Get the member who reacted without an API call if possible.
+        Reaction adds carry the member, and with the members intent nearly everyone is cached, so
+        fetching is only a fallback. Concurrent fetches of the same member share one request.
+        """
+        if payload.member is not None:
+            return payload.member
+        guild = self.bot.get_guild(payload.guild_id)
+        if guild is None:
+            return None
+        member = guild.get_member(payload.user_id)
+        if member is not None:
+            return member
+        try:
+            return await self.fetch_member(guild, payload.user_id)
+        except discord.NotFound:
+            return None  # They left the guild
 
     @commands.Cog.listener()
     async def on_raw_reaction_add(self, payload):
-        if payload.message_id in [820236163960668210, 820236203726077992]:
-            guild = self.bot.get_guild(payload.guild_id)
-            user = await guild.fetch_member(payload.user_id)
-            emoji_id = payload.emoji.id
-
-            if emoji_id == 820156388130160670:
-                # verification - 813668832047661076 -> role id
-                role = guild.get_role(813668832047661076)
-                await user.add_roles(role)
-
-            elif emoji_id == 819940534751199252:
-                # Windows - 819939970869231666 -> role id
-                role = guild.get_role(819939970869231666)
-                await user.add_roles(role)
-
-            elif emoji_id == 819940542283644988:
-                # Linux - 819940076090949642 -> role id
-                role = guild.get_role(819940076090949642)
-                await user.add_roles(role)
-
-            elif emoji_id == 820155872914833459:
-                # Announcement - 819770725170675722 -> role id
-                role = guild.get_role(819770725170675722)
-                await user.add_roles(role)
-
-            elif emoji_id == 820145356209389590:
-                # chat revive - 820127343901278219 -> role id
-                role = guild.get_role(820127343901278219)
-                await user.add_roles(role)
+        if payload.user_id == self.bot.user.id:
+            return  # The reactions of the menu itself
+        entry = self.registry.get(payload.message_id, payload.emoji)
+        if entry is None:
+            return
+
+        user = await self.resolve_member(payload)
+        if user is not None:
+            self.batcher.change(user, entry["role_id"], add=True)
 
     @commands.Cog.listener()
     async def on_raw_reaction_remove(self, payload):
-        if payload.message_id in [820236163960668210, 820236203726077992]:
-            guild = self.bot.get_guild(payload.guild_id)
-            user = await guild.fetch_member(payload.user_id)
-            emoji_id = payload.emoji.id
-
-            if emoji_id == 819940534751199252:
-                # Windows - 819939970869231666 -> role id
-                role = guild.get_role(819939970869231666)
-                await user.remove_roles(role)
-
-            elif emoji_id == 819940542283644988:
-                # Linux - 819940076090949642 -> role id
-                role = guild.get_role(819940076090949642)
-                await user.remove_roles(role)
-
-            elif emoji_id == 820155872914833459:
-                # Announcement - 819770725170675722 -> role id
-                role = guild.get_role(819770725170675722)
-                await user.remove_roles(role)
-
-            elif emoji_id == 820145356209389590:
-                # chat revive - 820127343901278219 -> role id
-                role = guild.get_role(820127343901278219)
-                await user.remove_roles(role)
+        if payload.user_id == self.bot.user.id:
+            return  # The reactions of the menu itself
+        entry = self.registry.get(payload.message_id, payload.emoji)
+        if entry is None or not entry["removable"]:
+            return
+
+        user = await self.resolve_member(payload)
+        if user is not None:
+            self.batcher.change(user, entry["role_id"], add=False)
+
+    def get_menu(self, message_id: int) -> dict:
+        menu = self.registry.menus.get(message_id)
+        if menu is None:
+            raise commands.BadArgument(f"No role menu on message `{message_id}`.")
+        return menu
+
+    def check_role(self, ctx, role: discord.Role) -> None:
+        """Refuse roles which the bot can't give, or which the author couldn't give themselves."""
+        if role.is_default() or role.managed:
+            raise commands.BadArgument(f"**{role.name}** can't be given by anyone.")
+        if role >= ctx.guild.me.top_role:
+            raise commands.BadArgument(f"**{role.name}** is above my highest role.")
+        if ctx.author != ctx.guild.owner and role >= ctx.author.top_role:
+            raise commands.BadArgument(f"**{role.name}** is above your highest role.")
+
+    async def refresh_menu(self, menu: dict) -> None:
+        """Update the embed and the reactions of the message the menu was sent as."""
+        channel = self.bot.get_channel(menu["channel_id"])
+        if channel is None:
+            return
+        try:
+            message = await channel.fetch_message(menu["message_id"])
+            await message.edit(embed=render_menu(menu))
+            for entry in menu["entries"]:
+                await message.add_reaction(entry["emoji"])
+        except discord.HTTPException as e:
+            print(e)
+
+    async def expected_members(
+        self, message: discord.Message, emoji: str
+    ) -> t.Optional[t.Set[int]]:
+        """Return the IDs of everyone who reacted with `emoji`, None if nobody has at all."""
+        for reaction in message.reactions:
+            if emoji_key(reaction.emoji) == emoji_key(emoji):
+                # users() pages through the reactions a hundred at a time
+                return {
+                    user.id
+                    async for user in reaction.users()
+                    if user.id != self.bot.user.id
+                }
+        return None
+
+    async def reconcile_menu(
+        self, menu: dict, prune: bool = False
+    ) -> t.Tuple[int, int]:
+        """
+        Give the roles of `menu` to everyone who reacted. With `prune`, also take the roles of
+        removable entries from those who didn't.
+        Return how many roles were added and removed.
+        """
+        channel = self.bot.get_channel(menu["channel_id"])
+        if channel is None:
+            print(
+                f"[ Log ] Role menu {menu['message_id']} has no known channel, bind it with rolemenu bind to reconcile it"
+            )
+            return 0, 0
+        message = await channel.fetch_message(menu["message_id"])
+
+        changes = []
+        for entry in menu["entries"]:
+            role = channel.guild.get_role(entry["role_id"])
+            expected = await self.expected_members(message, entry["emoji"])
+            if role is None or expected is None:
+                continue
+            current = {member.id for member in role.members}
+            changes.extend(
+                (member_id, role.id, True) for member_id in expected - current
+            )
+            # Nobody reacting usually means the menu was just (re)sent rather than that everyone
+            # took their reaction back, so an empty set never takes roles away
+            if prune and entry["removable"] and expected:
+                changes.extend(
+                    (member_id, role.id, False) for member_id in current - expected
+                )
+
+        for start in range(0, len(changes), RECONCILE_BATCH_SIZE):
+            for member_id, role_id, add in changes[
+                start : start + RECONCILE_BATCH_SIZE
+            ]:
+                member = channel.guild.get_member(member_id)
+                if member is not None:  # Reactions of people who left stay behind
+                    self.batcher.change(member, role_id, add)
+            await self.batcher.drain()
+            print(
+                f"[ Log ] Role menu {menu['message_id']}: {min(start + RECONCILE_BATCH_SIZE, len(changes))}/{len(changes)} role changes applied"
+            )
+
+        added = sum(1 for _, _, add in changes if add)
+        return added, len(changes) - added
+
+    async def reconcile(self, prune: bool = False) -> t.Tuple[int, int]:
+        """Reconcile every role menu, one at a time. Return the roles added and removed."""
+        await self.loading
+        if self.reconciling.locked():
+            return 0, 0
+        added = removed = 0
+        async with self.reconciling:
+            for menu in list(self.registry.menus.values()):
+                try:
+                    menu_added, menu_removed = await self.reconcile_menu(
+                        menu, prune=prune
+                    )
+                except discord.HTTPException as e:
+                    print(e)
+                    continue
+                added += menu_added
+                removed += menu_removed
+        print(f"[ Log ] Reaction roles reconciled: {added} added, {removed} removed")
+        return added, removed
+
+    @commands.group(aliases=["rr"], invoke_without_command=True)
+    @commands.has_permissions(manage_roles=True)
+    async def rolemenu(self, ctx):
+        """
+        Manage the reaction role menus
+        """
+        lines = [
+            f"`{message_id}` - {menu['title']} ({len(menu['entries'])} roles)"
+            for message_id, menu in self.registry.menus.items()
+        ]
+        await ctx.send("\n".join(lines) or "There are no role menus.")
+
+    @rolemenu.command(name="create")
+    @commands.has_permissions(manage_roles=True)
+    async def rolemenu_create(self, ctx, channel: discord.TextChannel, *, title):
+        """
+        Send a new, empty role menu to a channel
+        """
+        menu = {"title": title, "description": "", "entries": []}
+        message = await channel.send(embed=render_menu(menu))
+        menu.update(message_id=message.id, channel_id=channel.id)
+        await self.registry.save(menu)
+        await ctx.send(f"Role menu created, its ID is `{message.id}`.")
+
+    @rolemenu.command(name="add")
+    @commands.has_permissions(manage_roles=True)
+    async def rolemenu_add(
+        self,
+        ctx,
+        message_id: int,
+        emoji: str,
+        role: discord.Role,
+        removable: bool = True,
+        *,
+        section="",
+    ):
+        """
+        Add a role to a menu, or update the role of an emoji
+        """
+        menu = self.get_menu(message_id)
+        self.check_role(ctx, role)
+        # Reacting first makes sure the emoji exists and is usable before it's stored
+        channel = self.bot.get_channel(menu["channel_id"])
+        if channel is None:
+            raise commands.BadArgument(f"Can't find the channel of `{message_id}`.")
+        try:
+            message = await channel.fetch_message(message_id)
+            await message.add_reaction(emoji)
+        except discord.NotFound:
+            raise commands.BadArgument(
+                f"`{emoji}` isn't an emoji I can use, or the menu's message is gone."
+            )
+        except discord.HTTPException:
+            raise commands.BadArgument(f"`{emoji}` isn't an emoji I can use.")
+        entry = {
+            "emoji": emoji,
+            "role_id": role.id,
+            "label": role.name,
+            "section": section,
+            "removable": removable,
+        }
+        entries = [
+            e for e in menu["entries"] if emoji_key(e["emoji"]) != emoji_key(emoji)
+        ]
+        menu = {**menu, "entries": entries + [entry]}
+        await self.registry.save(menu)
+        await self.refresh_menu(menu)
+        await ctx.send(f"{emoji} now gives **{role.name}**.")
+
+    @rolemenu.command(name="remove")
+    @commands.has_permissions(manage_roles=True)
+    async def rolemenu_remove(self, ctx, message_id: int, emoji: str):
+        """
+        Remove a role from a menu
+        """
+        menu = self.get_menu(message_id)
+        entries = [
+            e for e in menu["entries"] if emoji_key(e["emoji"]) != emoji_key(emoji)
+        ]
+        menu = {**menu, "entries": entries}
+        await self.registry.save(menu)
+        await self.refresh_menu(menu)
+        await ctx.send(f"{emoji} removed from the menu.")
+
+    @rolemenu.command(name="delete")
+    @commands.has_permissions(manage_roles=True)
+    async def rolemenu_delete(self, ctx, message_id: int):
+        """
+        Forget a role menu, its message is left as is
+        """
+        self.get_menu(message_id)
+        await self.registry.delete(message_id)
+        await ctx.send("Role menu deleted.")
+
+    @rolemenu.command(name="bind")
+    @commands.has_permissions(manage_roles=True)
+    async def rolemenu_bind(self, ctx, channel: discord.TextChannel, message_id: int):
+        """
+        Tell which channel the message of a role menu is in, keeping its reactions
+        """
+        menu = self.get_menu(message_id)
+        try:
+            await channel.fetch_message(message_id)
+        except discord.NotFound:
+            raise commands.BadArgument(
+                f"Message `{message_id}` isn't in {channel.mention}."
+            )
+        await self.registry.save({**menu, "channel_id": channel.id})
+        await ctx.send(f"Role menu `{message_id}` bound to {channel.mention}.")
+
+    @rolemenu.command(name="sync", aliases=["reconcile"])
+    @commands.is_owner()
+    async def rolemenu_sync(self, ctx, prune: t.Optional[str] = None):
+        """
+        Apply the reactions missed while the bot was offline, pass --prune to also take the
+        roles of members who took their reaction back
+        """
+        if prune not in (None, "--prune"):
+            raise commands.BadArgument("The only option is `--prune`.")
+        if self.reconciling.locked():
+            return await ctx.send("The role menus are already being reconciled.")
+        async with ctx.typing():
+            added, removed = await self.reconcile(prune=prune is not None)
+        await ctx.send(
+            f"Role menus reconciled: {added} roles added, {removed} removed."
+        )
+
+    @rolemenu.command(name="reload")
+    @commands.is_owner()
+    async def rolemenu_reload(self, ctx):
+        """
+        Reload the role menus from the database
+        """
+        await self.registry.load()
+        await ctx.send(f"Reloaded {len(self.registry.menus)} role menus.")
 
 
 def setup(bot):
@@ -1,76 +1,194 @@
 """
 Credits goes to https://github.com/python-discord for the cog and docker
 """
+import asyncio
+import functools
+import hashlib
 import os
 import re
 import textwrap
-from io import BytesIO
+import time
+import traceback
+from collections import OrderedDict
+from contextlib import suppress
 from signal import Signals
 from typing import Optional, Tuple
 
 import aiohttp
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
+
+from utils.cache import AsyncCache
+from utils.codeblocks import extract_code, find_code
+from utils.paginator import LinePaginator
+from utils.paste import HastebinPaste, LocalPasteStore, PasteError
+from utils.sandbox import BackendPool
+from utils.scheduler import FairScheduler, Job
 
 ip = os.environ.get("ip")  # for docker container
+# Comma separated snekbox URLs (e.g. "http://10.0.0.2:8060,http://10.0.0.3:8060"), defaults to the one at `ip`
+snekbox_urls = os.environ.get("snekbox_urls", f"http://{ip}:8060").split(",")
+# Hastebin compatible service to upload long outputs to, the built-in paste store is used if unset
+paste_url = os.environ.get("paste_url")
+paste_dir = os.environ.get("paste_dir", "pastes")
+paste_host = os.environ.get("paste_host", "127.0.0.1")
+paste_port = int(os.environ.get("paste_port", 8061))
+# Where users reach the built-in paste store, which is disabled if unset. It listens on
+# paste_host, put it behind a reverse proxy rather than exposing it directly
+paste_public_url = os.environ.get("paste_public_url")
 SIGKILL = 9
-ESCAPE_REGEX = re.compile("[`\u202E\u200B]{3,}")
-FORMATTED_CODE_REGEX = re.compile(
-    r"(?P<delim>(?P<block>```)|``?)"  # code delimiter: 1-3 backticks; (?P=block) only matches if it's a block
-    r"(?(block)(?:(?P<lang>[a-z]+)\n)?)"  # if we're in a block, match optional language (only letters plus newline)
-    r"(?:[ \t]*\n)*"  # any blank (empty or tabs/spaces only) lines before the code
-    r"(?P<code>.*?)"  # extract all code inside the markup
-    r"\s*"  # any more whitespace before the end of the code markup
-    r"(?P=delim)",  # match the exact same delimiter from the start again
-    re.DOTALL | re.IGNORECASE,  # "." also matches newlines, case insensitive
-)
-RAW_CODE_REGEX = re.compile(
-    r"^(?:[ \t]*\n)*"  # any blank (empty or tabs/spaces only) lines before the code
-    r"(?P<code>.*?)"  # extract all the rest as code
-    r"\s*$",  # any trailing whitespace until the end of the string
-    re.DOTALL,  # "." also matches newlines
+MAX_CONCURRENT_EVALS = 2  # Evals running in each sandbox at the same time
+PROBE_INTERVAL = 30  # Seconds between backend health checks
+# Larger code isn't compiled locally and goes straight to the sandbox
+MAX_PRECHECK_SIZE = 50_000
+EVAL_TIMEOUT = 30  # Seconds
+MAX_EVALALL_BLOCKS = 6
+EVALALL_CONCURRENCY = 3  # Blocks of one !evalall sent to the sandbox at the same time
+MAX_TRACKED_EVALS = 100  # Recent evals which get re-evaluated when edited
+REEVAL_TTL = 300  # Seconds an eval stays editable
+REEVAL_DEBOUNCE = 2  # Seconds to wait for further edits before re-evaluating
+# Code using any of these can give a different result on every run, so it is never cached
+NONDETERMINISTIC_REGEX = re.compile(
+    r"\b(?:random|secrets|uuid|time|datetime|socket|urllib|requests|http|asyncio"
+    r"|threading|multiprocessing|subprocess|urandom|getpid|hash|id)\b"
 )
+ESCAPE_REGEX = re.compile("[`\u202E\u200B]{3,}")
+MAX_OUTPUT_LINES = 11
+MAX_OUTPUT_CHARS = 1000
+
+
+eval_cache = AsyncCache(max_size=256, ttl=600)
+
+
+def escape_mentions(text: str) -> str:
+    """Break up mentions with a zero-width space so evals can't ping anyone."""
+    return text.replace("<@", "<@\u200B").replace("<!@", "<!@\u200B")
+
+
+def code_digest(code: str) -> str:
+    """Hash `code` after normalizing surrounding blank lines and trailing whitespace."""
+    normalized = "\n".join(line.rstrip() for line in code.strip("\n").splitlines())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def is_cacheable(results: dict) -> bool:
+    """Whether the results are the code's own, not those of a failing or overloaded sandbox."""
+    # None when the sandbox failed, 255 when it errored and SIGKILL on timeouts, which can come
+    # from load rather than the code
+    return results.get("returncode") not in (None, 255, 128 + SIGKILL)
+
+
+def check_syntax(code: str) -> Optional[str]:
+    """Compile `code` and return the formatted SyntaxError like the sandbox would, or None if it compiles."""
+    try:
+        compile(code, "<string>", "exec", dont_inherit=True)
+    except (SyntaxError, ValueError) as e:
+        return "".join(traceback.format_exception_only(type(e), e))
+    except (MemoryError, RecursionError):
+        pass  # Too deeply nested to tell here, leave it to the sandbox
+    return None
+
+
+class QueueNotice:
+    """A single "queued" message for all the evals of one command, however many of them wait."""
+
+    def __init__(self, ctx) -> None:
+        self.ctx = ctx
+        self.shown = False
+        self.message: Optional[discord.Message] = None
+
+    async def show(self, position: int) -> None:
+        if self.shown:
+            return
+        self.shown = True
+        self.message = await self.ctx.send(
+            f"{self.ctx.author.mention} your evals are queued, the first at position {position}."
+        )
+
+    async def delete(self) -> None:
+        if self.message is not None:
+            with suppress(discord.NotFound):
+                await self.message.delete()
 
 
 class Snekbox(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self._last_result = None
-
-    async def upload_output(self, output):
-        if len(output) > 10000:
-            return "output took too long to upload"
-        async with aiohttp.ClientSession() as session:
-            data3 = BytesIO(output.encode("utf-8"))
-            async with session.post(
-                "https://paste.pythondiscsord.com/documents", data=data3
-            ) as resp:
-                data2 = await resp.json()
-                data = data2["key"]
-        return f"https://paste.pythondiscsord.com{data}"
+        self.session = None
+        # message id of an eval -> (response message, time it was sent), oldest first
+        self._recent_evals = OrderedDict()
+        self._pending_reevals = {}
+        self.backends = BackendPool(url.strip() for url in snekbox_urls)
+        self.scheduler = FairScheduler(
+            workers=MAX_CONCURRENT_EVALS * len(self.backends)
+        )
+        self.probe_backends.start()
+
+        self.local_paste = None
+        if paste_public_url:
+            self.local_paste = LocalPasteStore(
+                directory=paste_dir,
+                public_url=paste_public_url,
+                host=paste_host,
+                port=paste_port,
+            )
+            start = self.bot.loop.create_task(self.local_paste.start())
+            start.add_done_callback(self._paste_started)
+        self.paste = HastebinPaste(paste_url) if paste_url else self.local_paste
+        if self.paste is None:
+            print("[ Log ] No paste service configured, long outputs won't be linked")
+
+    def cog_unload(self):
+        self.probe_backends.cancel()
+        for task in self._pending_reevals.values():
+            task.cancel()
+        self.scheduler.close()
+        if self.session is not None:
+            self.bot.loop.create_task(self.session.close())
+        if self.local_paste is not None:
+            self.bot.loop.create_task(self.local_paste.close())
+        if self.paste is not None and self.paste is not self.local_paste:
+            self.bot.loop.create_task(self.paste.close())
+
+    def get_session(self) -> aiohttp.ClientSession:
+        """Return the long-lived session shared by every eval, creating it if needed."""
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(
+                # One extra connection per host is left for the health probes
+                connector=aiohttp.TCPConnector(
+                    limit=0, limit_per_host=MAX_CONCURRENT_EVALS + 1
+                ),
+                timeout=aiohttp.ClientTimeout(total=EVAL_TIMEOUT),
+            )
+        return self.session
+
+    async def upload_output(self, output: str) -> Optional[str]:
+        """
+        Upload the full output, falling back to the local paste store if the configured service fails.
+        Return None if there is no paste service.
+        """
+        if self.paste is None:
+            return None
+        try:
+            return await self.paste.upload(output)
+        except PasteError as e:
+            if self.local_paste is None or self.paste is self.local_paste:
+                print(f"[ Log ] {e}")
+                return "output could not be uploaded"
+            return await self.upload_output_locally(output, e)
+
+    async def upload_output_locally(self, output: str, error: PasteError) -> str:
+        print(f"[ Log ] {error}, using the local paste store")
+        try:
+            return await self.local_paste.upload(output)
+        except PasteError as e:
+            print(f"[ Log ] {e}")
+            return "output could not be uploaded"
 
     @staticmethod
     def prepare_input(code: str) -> str:
-        if match := list(FORMATTED_CODE_REGEX.finditer(code)):
-            blocks = [block for block in match if block.group("block")]
-
-            if len(blocks) > 1:
-                code = "\n".join(block.group("code") for block in blocks)
-                info = "several code blocks"
-            else:
-                match = match[0] if len(blocks) == 0 else blocks[0]
-                code, block, lang, delim = match.group("code", "block", "lang", "delim")
-                if block:
-                    info = (
-                        f"'{lang}' highlighted" if lang else "plain"
-                    ) + " code block"
-                else:
-                    info = f"{delim}-enclosed inline code"
-        else:
-            code = RAW_CODE_REGEX.fullmatch(code).group("code")
-            info = "unformatted or badly formatted code"
-
-        code = textwrap.dedent(code)
+        code, info = extract_code(code)
         return code
 
     @staticmethod
@@ -106,81 +224,242 @@ class Snekbox(commands.Cog):
         else:  # Exception
             return f"<:no:820156423509114900>"
 
-    async def format_output(self, output: str) -> Tuple[str, Optional[str]]:
+    @staticmethod
+    def preview_output(output: str) -> Tuple[str, bool]:
+        """
+        Return the numbered and truncated preview of `output` for the embed, and whether it was cut.
+        Only the first lines and characters that fit the preview are read, so the cost doesn't grow
+        with the size of the whole output. The mention and code-block escape checks only apply to
+        that preview, as nothing else of the output ends up in the message.
+        """
+        end = len(output)
+        while end and output[end - 1] == "\n":
+            end -= 1
+
+        if output.find("\n", 0, end) == -1:
+            preview = escape_mentions(output[: min(end, MAX_OUTPUT_CHARS)])
+            if end >= MAX_OUTPUT_CHARS or len(preview) >= MAX_OUTPUT_CHARS:
+                preview = f"{preview[:MAX_OUTPUT_CHARS]}\n... (output capped - output too long)"
+                truncated = True
+            else:
+                truncated = False
+        else:
+            lines, size, position = [], 0, 0
+            too_many_lines = False
+            for number in range(1, MAX_OUTPUT_LINES + 1):
+                line_end = output.find("\n", position, end)
+                stop = end if line_end == -1 else line_end
+                # Lines are only read up to what's left of the character budget
+                budget = max(MAX_OUTPUT_CHARS - size, 0)
+                line = escape_mentions(output[position : min(stop, position + budget)])
+                lines.append(f"{number:03d} | {line}")
+                size += len(lines[-1]) + 1
+
+                if line_end == -1:
+                    break
+                position = line_end + 1
+            else:
+                too_many_lines = (
+                    True  # The last line read still had a line break after it
+                )
+
+            preview = "\n".join(lines)
+            truncated = too_many_lines or len(preview) >= MAX_OUTPUT_CHARS
+            if too_many_lines:
+                if len(preview) >= MAX_OUTPUT_CHARS:
+                    preview = f"{preview[:MAX_OUTPUT_CHARS]}\n... (truncated - output too long, and contains too many lines)"
+                else:
+                    preview = (
+                        f"{preview}\n... (truncated - output contains too many lines)"
+                    )
+            elif truncated:
+                preview = f"{preview[:MAX_OUTPUT_CHARS]}\n... (output capped - output too long)"
 
-        output = output.rstrip("\n")
-        original_output = output  # To be uploaded to a pasting service if needed
-        paste_link = None
+        if ESCAPE_REGEX.search(preview):
+            return "You've tried to escape the Code block; will not output result", True
+        return preview, truncated
 
-        if "<@" in output:
-            output = output.replace("<@", "<@\u200B")  # Zero-width space
+    async def format_output(self, output: str) -> Tuple[str, Optional[str]]:
+        preview, truncated = self.preview_output(output)
+        # The untouched output is what gets uploaded, no copy of it is made here
+        paste_link = await self.upload_output(output) if truncated else None
+        return preview or "[Your code has no output]", paste_link
 
-        if "<!@" in output:
-            output = output.replace("<!@", "<!@\u200B")  # Zero-width space
+    @tasks.loop(seconds=PROBE_INTERVAL)
+    async def probe_backends(self):
+        await self.backends.probe(self.get_session())
 
-        if ESCAPE_REGEX.findall(output):
-            paste_link = await self.upload_output(original_output)
+    async def post_eval(self, code: str) -> dict:
+        return await self.backends.post_eval(self.get_session(), code)
+
+    async def queue_eval(
+        self, ctx, code: str, shared_notice: Optional[QueueNotice] = None
+    ) -> Tuple[dict, Job]:
+        """
+        Queue the eval behind the other users' evals and wait for its results.
+        The user is told their place in the queue if no sandbox slot is free right away, through
+        `shared_notice` if several evals of the command may have to wait.
+        """
+        job = self.scheduler.submit(ctx.author.id, lambda: self.post_eval(code))
+        free = self.scheduler.workers - self.scheduler.running
+        position = self.scheduler.position(job) - free
+
+        notice = None
+        if position > 0 and shared_notice is not None:
+            await shared_notice.show(position)
+        elif position > 0:
+            notice = await ctx.send(
+                f"{ctx.author.mention} your eval is queued at position {position}."
+            )
+        try:
+            return await job, job
+        finally:
+            if notice is not None:
+                with suppress(discord.NotFound):
+                    await notice.delete()
+
+    @eval_cache(
+        arg_offset=1,
+        key=lambda ctx, code, *_: code_digest(code),
+        should_cache=lambda result: is_cacheable(result[0]),
+    )
+    async def cached_eval(
+        self, ctx, code: str, shared_notice: Optional[QueueNotice] = None
+    ) -> Tuple[dict, Job]:
+        """Same as `queue_eval`, but identical code shares the results of a recent or running eval."""
+        return await self.queue_eval(ctx, code, shared_notice)
+
+    async def precheck(self, code: str) -> Optional[dict]:
+        """
+        Compile `code` in the default executor to catch syntax errors without a sandbox round-trip.
+        Return results shaped like the sandbox's for code that doesn't compile, None otherwise.
+        """
+        if len(code) > MAX_PRECHECK_SIZE:
+            return None
+
+        error = await self.bot.loop.run_in_executor(None, check_syntax, code)
+        if error is None:
+            return None
+        return {"stdout": error, "returncode": 1}
+
+    async def run_eval(
+        self, ctx, code: str, shared_notice: Optional[QueueNotice] = None
+    ) -> Tuple[dict, str]:
+        """Evaluate `code` and return its results along with a summary of where the time went."""
+        requested_at = time.perf_counter()
+        if (results := await self.precheck(code)) is not None:
             return (
-                "You've tried to escape the Code block; will not output result",
-                paste_link,
+                results,
+                f"Syntax checked locally in {time.perf_counter() - requested_at:.2f}s",
             )
 
-        truncated = False
-        lines = output.count("\n")
+        if NONDETERMINISTIC_REGEX.search(code):
+            results, job = await self.queue_eval(ctx, code, shared_notice)
+        else:
+            results, job = await self.cached_eval(ctx, code, shared_notice)
 
-        if lines > 0:
-            output = [
-                f"{i:03d} | {line}" for i, line in enumerate(output.split("\n"), 1)
-            ]
-            output = output[:11]  # Limiting to only 11 lines
-            output = "\n".join(output)
+        if job.enqueued_at < requested_at:
+            return results, "Cached result"
+        return results, f"Queued {job.queue_wait:.2f}s | Eval {job.run_time:.2f}s"
 
-        if lines > 10:
-            truncated = True
-            if len(output) >= 1000:
-                output = f"{output[:1000]}\n... (truncated - output too long, and contains too many lines)"
-            else:
-                output = f"{output}\n... (truncated - output contains too many lines)"
-        elif len(output) >= 1000:
-            truncated = True
-            output = f"{output[:1000]}\n... (output capped - output too long)"
+    async def render_results(self, results: dict) -> str:
+        """Describe the results of an eval with its status, output preview and paste link."""
+        msg, error = self.get_results_message(results)
 
-        if truncated:
-            paste_link = await self.upload_output(original_output)
+        if error:
+            output, paste_link = error, None
+        else:
+            output, paste_link = await self.format_output(results["stdout"])
+
+        icon = self.get_status_emoji(results)
+        msg = f"{icon} {msg}.\n\n```\n{output}\n```"
+        if paste_link:
+            msg = f"{msg}\nFull output: {paste_link}"
+        return msg
+
+    async def eval_embed(self, ctx, code: str) -> discord.Embed:
+        """Evaluate `code` and build the embed showing its results."""
+        results, timings = await self.run_eval(ctx, code)
+        msg = await self.render_results(results)
+
+        embed = discord.Embed(
+            timestamp=ctx.message.created_at, description=msg, color=242424
+        )
+        embed.set_author(name="Eval Completed", icon_url=ctx.author.avatar_url)
+        embed.set_footer(
+            text=f"PyBot | {timings}",
+            icon_url="https://i.imgur.com/5SQ08L2.jpg",
+        )
+        return embed
 
-        output = output or "[Your code has no output]"
+    async def send_eval(self, ctx, code: str):
+        async with ctx.typing():
+            embed = await self.eval_embed(ctx, code)
+            response = await ctx.send(embed=embed)
+        return response
 
-        return output, paste_link
+    def track_eval(self, message: discord.Message, response: discord.Message) -> None:
+        """Remember the response to an eval so it can be updated when the eval gets edited."""
+        now = time.monotonic()
+        while self._recent_evals:
+            _, (_, tracked_at) = next(iter(self._recent_evals.items()))
+            if (
+                now - tracked_at < REEVAL_TTL
+                and len(self._recent_evals) < MAX_TRACKED_EVALS
+            ):
+                break
+            self._recent_evals.popitem(last=False)
+        self._recent_evals[message.id] = (response, now)
+
+    @commands.Cog.listener()
+    async def on_message_edit(self, before, after):
+        tracked = self._recent_evals.get(after.id)
+        if tracked is None or before.content == after.content:
+            return
+
+        response, tracked_at = tracked
+        if time.monotonic() - tracked_at >= REEVAL_TTL:
+            del self._recent_evals[after.id]
+            return
+
+        # Debounce: only the last of several quick edits gets evaluated. A re-eval which is
+        # already running is cancelled too, so an older result never overwrites a newer one
+        if (pending := self._pending_reevals.pop(after.id, None)) is not None:
+            pending.cancel()
+        task = self.bot.loop.create_task(self.reeval(after, response))
+        task.add_done_callback(functools.partial(self._reeval_done, after.id))
+        self._pending_reevals[after.id] = task
 
-    async def post_eval(self, code: str) -> dict:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                f"http://{ip}:8060/eval", json={"input": code}, raise_for_status=True
-            ) as resp:
-                return await resp.json()
+    @staticmethod
+    def _paste_started(task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            print(
+                f"[ Log ] The local paste service failed to start: {task.exception()!r}"
+            )
 
-    async def send_eval(self, ctx, code: str):
-        async with ctx.typing():
-            results = await self.post_eval(code)
-            msg, error = self.get_results_message(results)
+    def _reeval_done(self, message_id: int, task: asyncio.Task) -> None:
+        if self._pending_reevals.get(message_id) is task:
+            del self._pending_reevals[message_id]
+        if not task.cancelled() and task.exception() is not None:
+            print(f"[ Log ] Re-evaluating {message_id} failed: {task.exception()!r}")
 
-            if error:
-                output, paste_link = error, None
-            else:
-                output, paste_link = await self.format_output(results["stdout"])
+    async def reeval(self, message: discord.Message, response: discord.Message):
+        """Evaluate the edited `message` again and show the new results in `response`."""
+        await asyncio.sleep(REEVAL_DEBOUNCE)
 
-            icon = self.get_status_emoji(results)
-            msg = f"{icon} {msg}.\n\n```\n{output}\n```"
-            if paste_link:
-                msg = f"{msg}\nFull output: {paste_link}"
+        ctx = await self.bot.get_context(message)
+        if ctx.command is not self.eval:
+            return
+        text = ctx.view.read_rest().strip()
+        if not text:
+            return
 
-            embed = discord.Embed(
-                timestamp=ctx.message.created_at, description=msg, color=242424
-            )
-            embed.set_author(name="Eval Completed", icon_url=ctx.author.avatar_url)
-            embed.set_footer(text="PyBot", icon_url="https://i.imgur.com/5SQ08L2.jpg")
-            response = await ctx.send(embed=embed)
-        return response
+        async with ctx.typing():
+            embed = await self.eval_embed(ctx, self.prepare_input(text))
+        try:
+            await response.edit(embed=embed)
+        except discord.NotFound:
+            self._recent_evals.pop(message.id, None)
 
     @commands.command(
         aliases=["e", "run", "start", "exec", "do", "py", "python", "code"]
@@ -192,6 +471,75 @@ class Snekbox(commands.Cog):
         code = self.prepare_input(text)
         await ctx.send(f"{ctx.author.mention}", delete_after=1)
         response = await self.send_eval(ctx, code)
+        self.track_eval(ctx.message, response)
+
+    @commands.command(aliases=["ea", "compare"])
+    async def evalall(self, ctx, *, text):
+        """
+        Evaluate every code block of the message on its own and compare their results
+        """
+        blocks = [
+            textwrap.dedent(match.code) for match in find_code(text) if match.block
+        ]
+        if len(blocks) < 2:
+            return await ctx.invoke(self.eval, text=text)
+        if len(blocks) > MAX_EVALALL_BLOCKS:
+            return await ctx.send(
+                f"{ctx.author.mention} you can compare at most {MAX_EVALALL_BLOCKS} code blocks."
+            )
+
+        semaphore = asyncio.Semaphore(EVALALL_CONCURRENCY)
+        # Blocks waiting in the queue share one notice instead of posting one each
+        notice = QueueNotice(ctx)
+
+        async def run_block(number: int, code: str) -> str:
+            async with semaphore:
+                try:
+                    results, timings = await self.run_eval(ctx, code, notice)
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    return f"**Block {number}**\nThe sandbox could not run this block."
+                return f"**Block {number}** ({timings})\n{await self.render_results(results)}"
+
+        start = time.perf_counter()
+        try:
+            async with ctx.typing():
+                lines = await asyncio.gather(
+                    *(run_block(number, code) for number, code in enumerate(blocks, 1))
+                )
+        finally:
+            await notice.delete()
+
+        embed = discord.Embed(timestamp=ctx.message.created_at, color=242424)
+        embed.set_author(name="Eval Completed", icon_url=ctx.author.avatar_url)
+        await LinePaginator.paginate(
+            lines,
+            ctx,
+            embed,
+            max_size=2000,
+            footer_text=f"PyBot | {len(blocks)} blocks in {time.perf_counter() - start:.2f}s",
+        )
+
+    @commands.command(hidden=True)
+    @commands.is_owner()
+    async def snekstats(self, ctx):
+        """
+        Show the health, load and latency of every snekbox backend
+        """
+        e = discord.Embed(title="Snekbox backends", color=0x7289DA)
+        for backend in self.backends.backends:
+            status = "Healthy" if backend.healthy else "Ejected"
+            value = (
+                f"**{status}** | {backend.in_flight} in flight\n"
+                f"{backend.requests} evals | {backend.errors} errors\n"
+                f"avg {backend.average_latency:.2f}s | p95 {backend.p95_latency:.2f}s"
+            )
+            if backend.last_error:
+                value = f"{value}\nLast error: {backend.last_error[:200]}"
+            e.add_field(name=backend.url, value=value, inline=False)
+        e.set_footer(
+            text=f"{len(self.scheduler)} queued | {self.scheduler.running} running"
+        )
+        await ctx.send(embed=e)
 
 
 def setup(bot):
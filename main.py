@@ -8,6 +8,8 @@ import discord
 from discord.ext import commands
 from pretty_help import PrettyHelp
 
+from utils.reaction_roles import render_menu
+
 # asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
 system("clear")
 
@@ -54,41 +56,27 @@ TOKEN = environ.get("TOKEN")
 bot = PyBot()
 
 # Reaction embed
-@bot.command(hidden=True)
+@bot.command(hidden=True, aliases=["wsend2"])
 @commands.is_owner()
-async def wsend(ctx):
+async def wsend(ctx, message_id: int):
     """
-    Use to send embeds for reaction Roles
+    Use to send the embed of a reaction role menu again, see `rolemenu` for the IDs.
+    The menu moves to the new message, use `rolemenu bind` instead to keep the old reactions
     """
-    e = discord.Embed(color=0x7289DA)
-    e.add_field(
-        name="Reaction Roles",
-        value="**Operating System:**\n\n"
-        "<:windows:819940534751199252> Windows\n\n"
-        "<:linux:819940542283644988> Linux/ Unix\n\n"
-        "**Notification Roles:**\n\n"
-        "<:announcement:820155872914833459> Announcement\n\n"
-        "<:chat_revive:820145356209389590> Chat Revive",
-    )
-    msg = await ctx.send(embed=e)
-    await msg.add_reaction("<:windows:819940534751199252>")
-    await msg.add_reaction("<:linux:819940542283644988>")
-    await msg.add_reaction("<:announcement:820155872914833459>")
-    await msg.add_reaction("<:chat_revive:820145356209389590>")
-
-
-# Verification embed
-@bot.command(hidden=True)
-@commands.is_owner()
-async def wsend2(ctx):
-    e = discord.Embed(color=0x7289DA)
-    e.add_field(
-        name="Welcome to PyVerse",
-        value="Before getting started please react with <:yes:820156388130160670> "
-        "to get access to rest of the channels",
+    registry = bot.get_cog("ReactionRoles").registry
+    menu = registry.menus.get(message_id)
+    if menu is None:
+        return await ctx.send(f"No role menu on message `{message_id}`.")
+
+    msg = await ctx.send(embed=render_menu(menu))
+    for entry in menu["entries"]:
+        await msg.add_reaction(entry["emoji"])
+    # Reactions on the new message are the ones that count from now on
+    await registry.move(menu, msg)
+    await ctx.send(
+        f"Role menu moved to `{msg.id}`. Reactions on the old message no longer count, "
+        "so a `rolemenu sync --prune` would take their roles away."
     )
-    msg = await ctx.send(embed=e)
-    await msg.add_reaction("<:yes:820156388130160670>")
 
 
 [
@@ -0,0 +1,245 @@
+import asyncio
+import struct
+import typing as t
+from functools import partial
+
+import aiohttp
+import discord
+
+from utils.attachments import AttachmentPolicy, get_extension, read_at_most
+
+EOCD_SIGNATURE = b"PK\x05\x06"
+EOCD_FORMAT = struct.Struct("<4s4H2LH")
+ZIP64_LOCATOR_SIGNATURE = b"PK\x06\x07"
+ZIP64_LOCATOR_FORMAT = struct.Struct("<4sLQL")
+ZIP64_EOCD_SIGNATURE = b"PK\x06\x06"
+ZIP64_EOCD_FORMAT = struct.Struct("<4sQ2H2L4Q")
+CENTRAL_SIGNATURE = b"PK\x01\x02"
+CENTRAL_FORMAT = struct.Struct("<4s6H3L5H2L")
+
+# Most archives have no comment, so their end record is found in the first, small read
+TAIL_BYTES = 4096
+# The end record may be followed by a comment of up to 64 KB
+MAX_TAIL_BYTES = EOCD_FORMAT.size + 0xFFFF + ZIP64_LOCATOR_FORMAT.size
+MAX_CENTRAL_DIRECTORY_BYTES = 1024 * 1024
+
+MAX_MEMBERS = 10_000
+MAX_UNCOMPRESSED_SIZE = 1024 * 1024 * 1024
+MAX_COMPRESSION_RATIO = 100
+# Small files compress absurdly well too, the ratio only matters past this size
+RATIO_MIN_SIZE = 1024 * 1024
+
+
+class ArchiveError(Exception):
+    """Raised when an archive can't be read."""
+
+
+class ArchiveMember(t.NamedTuple):
+    name: str
+    compressed_size: int
+    size: int
+
+    @property
+    def is_dir(self) -> bool:
+        return self.name.endswith("/")
+
+
+class EndRecord(t.NamedTuple):
+    entries: int
+    cd_size: int
+    cd_offset: int
+
+
+def find_end_record(tail: bytes) -> t.Tuple[EndRecord, int]:
+    """
+    Find the end of central directory record in `tail`, the last bytes of a zip file.
+    Return it along with the offset of the zip64 end record relative to the start of the
+    file, or -1 if the archive isn't a zip64 one.
+    """
+    index = tail.rfind(EOCD_SIGNATURE)
+    if index == -1 or len(tail) - index < EOCD_FORMAT.size:
+        raise ArchiveError("end of central directory not found")
+    _, _, _, _, entries, cd_size, cd_offset, _ = EOCD_FORMAT.unpack_from(tail, index)
+
+    locator = index - ZIP64_LOCATOR_FORMAT.size
+    if locator >= 0 and tail[locator : locator + 4] == ZIP64_LOCATOR_SIGNATURE:
+        _, _, zip64_offset, _ = ZIP64_LOCATOR_FORMAT.unpack_from(tail, locator)
+        return EndRecord(entries, cd_size, cd_offset), zip64_offset
+    return EndRecord(entries, cd_size, cd_offset), -1
+
+
+def parse_zip64_end_record(data: bytes) -> EndRecord:
+    if len(data) < ZIP64_EOCD_FORMAT.size or not data.startswith(ZIP64_EOCD_SIGNATURE):
+        raise ArchiveError("invalid zip64 end of central directory")
+    fields = ZIP64_EOCD_FORMAT.unpack_from(data)
+    return EndRecord(entries=fields[7], cd_size=fields[8], cd_offset=fields[9])
+
+
+def _zip64_sizes(extra: bytes, compressed_size: int, size: int) -> t.Tuple[int, int]:
+    """Read the real sizes of a member from its zip64 extra field, where needed."""
+    position = 0
+    while position + 4 <= len(extra):
+        header_id, length = struct.unpack_from("<2H", extra, position)
+        position += 4
+        if header_id == 0x0001:
+            field = extra[position : position + length]
+            # Only the sizes which overflowed are present, uncompressed one first
+            if size == 0xFFFFFFFF and len(field) >= 8:
+                (size,) = struct.unpack_from("<Q", field)
+                field = field[8:]
+            if compressed_size == 0xFFFFFFFF and len(field) >= 8:
+                (compressed_size,) = struct.unpack_from("<Q", field)
+            break
+        position += length
+    return compressed_size, size
+
+
+def parse_central_directory(data: bytes, entries: int) -> t.List[ArchiveMember]:
+    """Parse the members listed in the central directory `data`."""
+    members = []
+    position = 0
+    for _ in range(entries):
+        if position + CENTRAL_FORMAT.size > len(data):
+            raise ArchiveError("truncated central directory")
+        fields = CENTRAL_FORMAT.unpack_from(data, position)
+        if fields[0] != CENTRAL_SIGNATURE:
+            raise ArchiveError("invalid central directory entry")
+        flags, compressed_size, size = fields[3], fields[8], fields[9]
+        name_length, extra_length, comment_length = fields[10:13]
+
+        position += CENTRAL_FORMAT.size
+        raw_name = data[position : position + name_length]
+        extra = data[position + name_length : position + name_length + extra_length]
+        position += name_length + extra_length + comment_length
+
+        # Bit 11 marks UTF-8 names, everything else is cp437
+        name = raw_name.decode("utf-8" if flags & 0x800 else "cp437", "replace")
+        compressed_size, size = _zip64_sizes(extra, compressed_size, size)
+        members.append(ArchiveMember(name, compressed_size, size))
+    return members
+
+
+def check_members(
+    members: t.List[ArchiveMember], policy: AttachmentPolicy
+) -> t.List[str]:
+    """Return why the archive with `members` isn't allowed, an empty list if it is."""
+    if len(members) > MAX_MEMBERS:
+        return [f"more than {MAX_MEMBERS} files"]
+
+    problems = []
+    if sum(member.size for member in members) > MAX_UNCOMPRESSED_SIZE:
+        problems.append("too large once extracted")
+    for member in members:
+        if member.is_dir:
+            continue
+        extension = get_extension(member.name)
+        if extension in policy.inspect:
+            problems.append(f"nested archive `{member.name}`")
+        elif not policy.is_allowed(extension):
+            problems.append(f"`{member.name}`")
+        elif (
+            member.size > RATIO_MIN_SIZE
+            and member.size > member.compressed_size * MAX_COMPRESSION_RATIO
+        ):
+            problems.append(f"`{member.name}` is suspiciously compressed")
+    return problems
+
+
+def inspect_central_directory(
+    data: bytes, entries: int, policy: AttachmentPolicy
+) -> t.List[str]:
+    return check_members(parse_central_directory(data, entries), policy)
+
+
+async def fetch_range(
+    session: aiohttp.ClientSession, url: str, start: int, end: int
+) -> bytes:
+    """Download bytes `start` to `end` (exclusive) of `url`."""
+    headers = {"Range": f"bytes={start}-{end - 1}"}
+    async with session.get(url, headers=headers) as resp:
+        resp.raise_for_status()
+        if resp.status != 206 and (start, end) != (0, resp.content_length):
+            # Downloading the whole file is exactly what this is meant to avoid
+            raise ArchiveError("the server doesn't support range requests")
+        return await read_at_most(resp.content, end - start)
+
+
+async def inspect_zip(
+    session: aiohttp.ClientSession,
+    attachment: discord.Attachment,
+    policy: AttachmentPolicy,
+) -> t.List[str]:
+    """
+    Check the files inside the zip `attachment` against `policy`, without downloading it.
+    Only the end of the archive, holding the list of its files, is requested.
+    """
+    size = attachment.size
+    tail_start = max(size - TAIL_BYTES, 0)
+    tail = await fetch_range(session, attachment.url, tail_start, size)
+    if EOCD_SIGNATURE not in tail and tail_start > 0:
+        # The archive has a comment, read as far back as one can go
+        tail_start = max(size - MAX_TAIL_BYTES, 0)
+        tail = await fetch_range(session, attachment.url, tail_start, size)
+
+    end, zip64_offset = find_end_record(tail)
+    if zip64_offset != -1:
+        if zip64_offset >= tail_start:
+            data = tail[zip64_offset - tail_start :]
+        else:
+            data = await fetch_range(
+                session,
+                attachment.url,
+                zip64_offset,
+                zip64_offset + ZIP64_EOCD_FORMAT.size,
+            )
+        end = parse_zip64_end_record(data)
+
+    if end.entries > MAX_MEMBERS or end.cd_size > MAX_CENTRAL_DIRECTORY_BYTES:
+        return [f"more than {MAX_MEMBERS} files"]
+    if end.cd_offset + end.cd_size > size:
+        raise ArchiveError("central directory out of bounds")
+
+    if end.cd_offset >= tail_start:
+        # Small archives fit entirely in the tail which was already downloaded
+        offset = end.cd_offset - tail_start
+        data = tail[offset : offset + end.cd_size]
+    else:
+        data = await fetch_range(
+            session, attachment.url, end.cd_offset, end.cd_offset + end.cd_size
+        )
+
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        None, partial(inspect_central_directory, data, end.entries, policy)
+    )
+
+
+async def find_archive_problems(
+    session: aiohttp.ClientSession,
+    attachments: t.Iterable[discord.Attachment],
+    policy: AttachmentPolicy,
+) -> t.List[t.Tuple[str, str]]:
+    """
+    Inspect the archives among `attachments` concurrently.
+    Return (filename, problem) for every archive that isn't allowed, including unreadable ones.
+    """
+    archives = [
+        attachment
+        for attachment in attachments
+        if get_extension(attachment.filename) in policy.inspect
+    ]
+    results = await asyncio.gather(
+        *(inspect_zip(session, attachment, policy) for attachment in archives),
+        return_exceptions=True,
+    )
+
+    found = []
+    for attachment, result in zip(archives, results):
+        if isinstance(result, (ArchiveError, struct.error)):
+            # An archive that can't be listed can't be vouched for either
+            found.append((attachment.filename, "unreadable archive"))
+        elif isinstance(result, Exception):
+            continue  # Not being able to check a file is no reason to delete it
+        else:
+            found.extend((attachment.filename, problem) for problem in result)
+    return found
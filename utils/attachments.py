@@ -0,0 +1,155 @@
+import asyncio
+import json
+import typing as t
+from os.path import splitext
+
+import aiohttp
+import discord
+
+# Only this much of each attachment is downloaded to check its content
+SNIFF_BYTES = 4096
+
+# Leading bytes of executables that shouldn't get through under an innocent extension
+EXECUTABLE_SIGNATURES = (
+    (b"MZ", "Windows executable"),
+    (b"\x7fELF", "ELF executable"),
+    (b"\xfe\xed\xfa\xce", "Mach-O executable"),
+    (b"\xfe\xed\xfa\xcf", "Mach-O executable"),
+    (b"\xce\xfa\xed\xfe", "Mach-O executable"),
+    (b"\xcf\xfa\xed\xfe", "Mach-O executable"),
+    (b"#!", "script"),
+)
+
+
+def normalize_extension(extension: str) -> str:
+    """Return `extension` lowercased and with a leading dot, the way `splitext` gives it."""
+    extension = extension.strip().lower()
+    return extension if extension.startswith(".") else f".{extension}"
+
+
+def get_extension(filename: str) -> str:
+    return splitext(filename.lower())[1]
+
+
+class AttachmentPolicy:
+    """
+    Compiled attachment rules of a guild.
+    Extensions in `blocked` are never allowed. If `allowed` isn't empty, any extension which isn't
+    in it is blocked as well. With `sniff` enabled, the first bytes of otherwise allowed
+    attachments are checked for executables hiding behind a harmless extension.
+    Archives with an extension in `inspect` pass the extension check, their content is then
+    checked against the same rules instead.
+    """
+
+    __slots__ = ("allowed", "blocked", "inspect", "sniff")
+
+    def __init__(
+        self,
+        allowed: t.Iterable[str],
+        blocked: t.Iterable[str],
+        sniff: bool = True,
+        inspect: t.Iterable[str] = (),
+    ) -> None:
+        self.allowed = frozenset(map(normalize_extension, allowed))
+        self.blocked = frozenset(map(normalize_extension, blocked))
+        self.inspect = frozenset(map(normalize_extension, inspect))
+        self.sniff = sniff
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "AttachmentPolicy":
+        return cls(
+            data.get("allowed", ()),
+            data.get("blocked", ()),
+            data.get("sniff", True),
+            data.get("inspect", ()),
+        )
+
+    def is_allowed(self, extension: str) -> bool:
+        if extension in self.blocked:
+            return False
+        if extension in self.inspect:
+            return True
+        return not self.allowed or extension in self.allowed
+
+    def disallowed_extensions(
+        self, attachments: t.Iterable[discord.Attachment]
+    ) -> t.Set[str]:
+        """Get the disallowed extensions among `attachments`."""
+        extensions = {get_extension(attachment.filename) for attachment in attachments}
+        return {extension for extension in extensions if not self.is_allowed(extension)}
+
+
+class PolicyRegistry:
+    """Per-guild attachment policies, loaded from a JSON file and reloadable at runtime."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.default = AttachmentPolicy((), ())
+        self._guilds: t.Dict[int, AttachmentPolicy] = {}
+
+    def load(self) -> None:
+        """(Re)compile the policies from the file, replacing the current ones only on success."""
+        with open(self.path, encoding="utf-8") as file:
+            data = json.load(file)
+
+        default = data.get("default", {})
+        guilds = {
+            int(guild_id): AttachmentPolicy.from_dict({**default, **policy})
+            for guild_id, policy in data.get("guilds", {}).items()
+        }
+        self.default, self._guilds = AttachmentPolicy.from_dict(default), guilds
+
+    def get(self, guild: discord.Guild) -> AttachmentPolicy:
+        return self._guilds.get(guild.id, self.default)
+
+
+def detect_executable(head: bytes) -> t.Optional[str]:
+    """Return what kind of executable `head` (the first bytes of a file) belongs to, if any."""
+    for signature, kind in EXECUTABLE_SIGNATURES:
+        if head.startswith(signature):
+            return kind
+    return None
+
+
+async def read_at_most(content: aiohttp.StreamReader, size: int) -> bytes:
+    """Read up to `size` bytes of `content`, stopping early only at the end of the stream."""
+    chunks, remaining = [], size
+    while remaining > 0:
+        chunk = await content.read(remaining)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b"".join(chunks)
+
+
+async def fetch_head(
+    session: aiohttp.ClientSession, url: str, size: int = SNIFF_BYTES
+) -> bytes:
+    """
+    Download only the first `size` bytes of `url` using a ranged request.
+    At most `size` bytes are read even if the server ignores the range and sends everything.
+    """
+    async with session.get(url, headers={"Range": f"bytes=0-{size - 1}"}) as resp:
+        resp.raise_for_status()
+        return await read_at_most(resp.content, size)
+
+
+async def find_disguised_executables(
+    session: aiohttp.ClientSession, attachments: t.Iterable[discord.Attachment]
+) -> t.List[t.Tuple[str, str]]:
+    """Sniff `attachments` concurrently and return (filename, kind) of every hidden executable."""
+    attachments = list(attachments)
+    heads = await asyncio.gather(
+        *(fetch_head(session, attachment.url) for attachment in attachments),
+        return_exceptions=True,
+    )
+
+    found = []
+    for attachment, head in zip(attachments, heads):
+        if isinstance(head, Exception):
+            continue  # Not being able to check a file is no reason to delete it
+        kind = detect_executable(head)
+        if kind is not None:
+            found.append((attachment.filename, kind))
+    return found
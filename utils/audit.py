@@ -0,0 +1,230 @@
+import asyncio
+import time
+import typing as t
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import discord
+from discord import AuditLogAction
+
+# Type of the coroutine used to actually dispatch an (enriched) log embed
+Dispatcher = t.Callable[[discord.Embed], t.Awaitable[None]]
+
+# Seconds the use counts of an audit-log entry are remembered after it was last fetched
+USAGE_TTL = 3600
+
+# Seconds an audit-log entry may predate the event it explains, the gateway event follows the
+# entry and the clocks of Discord and the bot differ a little
+EVENT_SLACK = 5.0
+
+
+class _Usage:
+    """How many uses of an aggregated audit-log entry (`extra.count`) were seen and attributed."""
+
+    __slots__ = ("entry", "count", "unclaimed", "bumped_at", "seen_at")
+
+    def __init__(
+        self, entry: discord.AuditLogEntry, count: int, unclaimed: int, now: float
+    ) -> None:
+        self.entry = entry
+        self.count = count
+        # Uses not matched to an event yet
+        self.unclaimed = unclaimed
+        self.bumped_at = self.seen_at = now
+
+
+class AuditLogCorrelator:
+    """
+    Attach the responsible moderator from the audit log to queued log events.
+    Instead of fetching the audit log once per event, events are queued per guild for a short
+    `window`. When the window closes the audit log is read back to the first queued event, at
+    least `limit` and at most `max_entries` entries, which is one request unless the burst was
+    large. The entries are cached by `(action, target_id)` and every queued event is enriched from
+    that cache before being dispatched, with an entry created around or after the event only.
+    Events in a burst (mass bans, purges, role clean ups) therefore share the audit-log fetch.
+    Discord aggregates the deletes of one moderator into a single `message_delete` entry, bumping
+    its `extra.count` instead of creating a new one. Those entries are matched by channel too, and
+    each new use of one is attributed once only: an author deleting their own message right after
+    a moderator did has no use left to match.
+    """
+
+    def __init__(
+        self,
+        dispatch: Dispatcher,
+        window: float = 1.5,
+        limit: int = 50,
+        max_entries: int = 500,
+        ttl: float = 60.0,
+    ) -> None:
+        self._dispatch = dispatch
+        self.window = window
+        self.limit = limit
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+        # (guild_id, action, target_id) -> most recent audit-log entry
+        self._entries: t.Dict[tuple, discord.AuditLogEntry] = {}
+        # (guild_id, target_id, channel_id) -> {entry id: uses}, of message_delete entries
+        self._deletes: t.DefaultDict[tuple, t.Dict[int, _Usage]] = defaultdict(dict)
+        # guild_id -> [(action, target_id, channel_id, embed, when), ...] waiting for the next fetch
+        self._pending: t.DefaultDict[int, list] = defaultdict(list)
+        self._flushers: t.Dict[int, asyncio.Task] = {}
+
+    async def enqueue(
+        self,
+        guild: discord.Guild,
+        action: AuditLogAction,
+        target_id: int,
+        embed: discord.Embed,
+        channel_id: t.Optional[int] = None,
+    ) -> None:
+        """
+        Queue `embed` to be enriched with the actor of `action` on `target_id` and dispatched.
+        `channel_id` is the channel of a deleted message, for `message_delete`.
+        """
+        if guild is None or not guild.me.guild_permissions.view_audit_log:
+            return await self._dispatch(embed)
+
+        now = datetime.utcnow()
+        entry = self._lookup(guild.id, action, target_id, now, channel_id)
+        if entry is not None:
+            self._enrich(embed, entry)
+            return await self._dispatch(embed)
+
+        self._pending[guild.id].append((action, target_id, channel_id, embed, now))
+        if guild.id not in self._flushers:
+            self._flushers[guild.id] = asyncio.create_task(self._flush(guild))
+
+    def _lookup(
+        self,
+        guild_id: int,
+        action: AuditLogAction,
+        target_id: int,
+        when: datetime,
+        channel_id: t.Optional[int] = None,
+    ) -> t.Optional[discord.AuditLogEntry]:
+        """
+        Return a cached audit-log entry if it was created no earlier than `EVENT_SLACK` seconds
+        before the event at `when`, an older one is about a previous action on the target.
+        A `message_delete` entry is returned instead if it has a recent use left to claim.
+        """
+        if action is AuditLogAction.message_delete:
+            for usage in self._deletes.get(
+                (guild_id, target_id, channel_id), {}
+            ).values():
+                if self._has_unclaimed(usage):
+                    usage.unclaimed -= 1
+                    return usage.entry
+            return None
+
+        entry = self._entries.get((guild_id, action, target_id))
+        if entry is None or entry.created_at < when - timedelta(seconds=EVENT_SLACK):
+            return None
+        return entry
+
+    def _is_fresh(self, entry: discord.AuditLogEntry) -> bool:
+        """Old entries for the same target (e.g. a previous ban) must not be attributed."""
+        return (datetime.utcnow() - entry.created_at).total_seconds() <= self.ttl
+
+    def _has_unclaimed(self, usage: _Usage) -> bool:
+        return usage.unclaimed > 0 and time.monotonic() - usage.bumped_at <= self.ttl
+
+    def _observe(self, guild_id: int, entry: discord.AuditLogEntry) -> None:
+        """Record the new uses of a `message_delete` entry since it was last fetched."""
+        channel = getattr(entry.extra, "channel", None)
+        usages = self._deletes[
+            (guild_id, entry.target.id, getattr(channel, "id", None))
+        ]
+        count = getattr(entry.extra, "count", None) or 1
+        now = time.monotonic()
+
+        usage = usages.get(entry.id)
+        if usage is None:
+            # Seen for the first time, only the uses of an entry created just now are new
+            unclaimed = count if self._is_fresh(entry) else 0
+            usages[entry.id] = _Usage(entry, count, unclaimed, now)
+            return
+
+        if count > usage.count:
+            usage.unclaimed += count - usage.count
+            usage.count = count
+            usage.bumped_at = now
+        usage.entry = entry
+        usage.seen_at = now
+
+    def _prune(self) -> None:
+        """Drop all entries which outlived the TTL."""
+        for key in [k for k, e in self._entries.items() if not self._is_fresh(e)]:
+            del self._entries[key]
+
+        # The counts of message deletes are kept longer, to tell new uses from old ones
+        now = time.monotonic()
+        for key, usages in list(self._deletes.items()):
+            for entry_id in [
+                i for i, u in usages.items() if now - u.seen_at > USAGE_TTL
+            ]:
+                del usages[entry_id]
+            if not usages:
+                del self._deletes[key]
+
+    async def _flush(self, guild: discord.Guild) -> None:
+        """Wait for the window to close, fetch the audit log once and dispatch the queued events."""
+        try:
+            await asyncio.sleep(self.window)
+        finally:
+            self._flushers.pop(guild.id, None)
+            pending = self._pending.pop(guild.id, [])
+
+        try:
+            entries = await self._fetch(guild, min(event[-1] for event in pending))
+        except discord.HTTPException as e:
+            print(f"[ Log ] Could not fetch audit log of {guild}: {e}")
+            entries = []
+
+        self._prune()
+        # The audit log is newest first, keep only the most recent entry for each key
+        for entry in reversed(entries):
+            target_id = getattr(entry.target, "id", None)
+            if target_id is None:
+                continue
+            if entry.action is AuditLogAction.message_delete:
+                # Even an old entry may have been used again, its count tells
+                self._observe(guild.id, entry)
+            elif self._is_fresh(entry):
+                self._entries[(guild.id, entry.action, target_id)] = entry
+
+        for action, target_id, channel_id, embed, when in pending:
+            entry = self._lookup(guild.id, action, target_id, when, channel_id)
+            if entry is not None:
+                self._enrich(embed, entry)
+            await self._dispatch(embed)
+
+    async def _fetch(
+        self, guild: discord.Guild, since: datetime
+    ) -> t.List[discord.AuditLogEntry]:
+        """
+        Return the audit-log entries of `guild` back to the event at `since`, newest first.
+        The first `limit` entries are always read, older message deletes may have been used again.
+        """
+        since -= timedelta(seconds=EVENT_SLACK)
+        entries = []
+        async for entry in guild.audit_logs(limit=self.max_entries):
+            if len(entries) >= self.limit and entry.created_at < since:
+                break
+            entries.append(entry)
+        return entries
+
+    @staticmethod
+    def _enrich(embed: discord.Embed, entry: discord.AuditLogEntry) -> None:
+        """Add the responsible user (and reason, if any) of `entry` to `embed`."""
+        value = f"{entry.user.mention} ({entry.user.id})"
+        if entry.reason:
+            value = f"{value}\nReason -> {entry.reason}"
+        embed.add_field(name="Responsible moderator", value=value, inline=False)
+
+    def cancel(self) -> None:
+        """Cancel all scheduled fetches, used when the cog gets unloaded."""
+        for task in self._flushers.values():
+            task.cancel()
+        self._flushers.clear()
+        self._pending.clear()
@@ -0,0 +1,106 @@
+"""
+Check `utils.codeblocks` against the regexes it replaced and benchmark both.
+Run with `python -m utils.bench_codeblocks [fuzz iterations]`.
+"""
+import random
+import re
+import sys
+import textwrap
+import timeit
+
+from utils.codeblocks import EXTRA_LANG_CHARS, extract_code
+
+# The regexes previously used by the snekbox cog, kept here as the reference implementation
+FORMATTED_CODE_REGEX = re.compile(
+    r"(?P<delim>(?P<block>```)|``?)"
+    r"(?(block)(?:(?P<lang>[a-z]+)\n)?)"
+    r"(?:[ \t]*\n)*"
+    r"(?P<code>.*?)"
+    r"\s*"
+    r"(?P=delim)",
+    re.DOTALL | re.IGNORECASE,
+)
+RAW_CODE_REGEX = re.compile(
+    r"^(?:[ \t]*\n)*" r"(?P<code>.*?)" r"\s*$",
+    re.DOTALL,
+)
+
+# Small alphabet so backticks, languages and whitespace collide often, with every non-ASCII
+# character the language group matches
+FUZZ_ALPHABET = [
+    "`",
+    "``",
+    "```",
+    "py",
+    "Py",
+    "\n",
+    " ",
+    "\t",
+    "x",
+    "　",
+    "\x1c",
+    *sorted(EXTRA_LANG_CHARS),
+]
+
+
+def legacy_extract_code(code: str) -> str:
+    """The regex based `prepare_input` as it was before the single-pass scanner."""
+    if match := list(FORMATTED_CODE_REGEX.finditer(code)):
+        blocks = [block for block in match if block.group("block")]
+
+        if len(blocks) > 1:
+            code = "\n".join(block.group("code") for block in blocks)
+        else:
+            match = match[0] if len(blocks) == 0 else blocks[0]
+            code = match.group("code")
+    else:
+        code = RAW_CODE_REGEX.fullmatch(code).group("code")
+
+    return textwrap.dedent(code)
+
+
+def check_lang_chars() -> None:
+    """Assert that `EXTRA_LANG_CHARS` holds every non-ASCII character `[a-z]` matches."""
+    lang_regex = re.compile("[a-z]", re.IGNORECASE)
+    matched = {
+        char for char in map(chr, range(0x80, 0x110000)) if lang_regex.fullmatch(char)
+    }
+    assert matched == EXTRA_LANG_CHARS, f"{matched ^ EXTRA_LANG_CHARS} differ"
+    print(f"lang chars: {''.join(sorted(matched))} match")
+
+
+def fuzz(iterations: int, seed: int = 0) -> None:
+    """Assert that both implementations agree on random markup-heavy messages."""
+    rng = random.Random(seed)
+    for _ in range(iterations):
+        text = "".join(rng.choices(FUZZ_ALPHABET, k=rng.randint(0, 40)))
+        expected, (actual, _) = legacy_extract_code(text), extract_code(text)
+        assert expected == actual, f"Mismatch for {text!r}: {expected!r} != {actual!r}"
+    print(f"fuzz: {iterations} random messages match")
+
+
+ADVERSARIAL_INPUTS = {
+    "single backticks": "` " * 2000,
+    "unclosed blocks": "```py\n" + "x ` y `` " * 500,
+    "many inline pieces": "`a` " * 1000,
+    "trailing whitespace": "```" + " " * 4000 + "x",
+    "blank lines, unclosed": "```x" + " \n" * 2000 + "``",
+    "plain text": "print('hello world')\n" * 200,
+}
+
+
+def benchmark(number: int = 20) -> None:
+    """Time both implementations on inputs which make the regexes backtrack."""
+    for name, text in ADVERSARIAL_INPUTS.items():
+        legacy = timeit.timeit(lambda: legacy_extract_code(text), number=number)
+        scanner = timeit.timeit(lambda: extract_code(text), number=number)
+        print(
+            f"{name:>20} ({len(text)} chars): regex {legacy / number * 1000:8.3f} ms"
+            f" | scanner {scanner / number * 1000:8.3f} ms"
+        )
+
+
+if __name__ == "__main__":
+    check_lang_chars()
+    fuzz(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
+    benchmark()
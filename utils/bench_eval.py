@@ -0,0 +1,89 @@
+"""
+Benchmark the eval pipeline (`prepare_input` -> `post_eval` -> `format_output`) end to end
+against the fake snekbox and paste server of `utils.fake_snekbox`.
+Run with `python -m utils.bench_eval --help` to see the options.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+import aiohttp
+from aiohttp import web
+
+from utils.fake_snekbox import add_arguments, app_from_args
+
+MESSAGE = "```py\nfor i in range(10):\n    print(i)\n```"
+
+
+async def run_benchmark(args: argparse.Namespace) -> None:
+    # Every fake backend listens on its own port, as the connection pool is limited per host
+    runner = web.AppRunner(app_from_args(args))
+    await runner.setup()
+    ports = range(args.port, args.port + args.backends)
+    for port in ports:
+        await web.TCPSite(runner, "127.0.0.1", port).start()
+
+    # The cog reads its configuration when imported, so point it at the fake server first
+    urls = [f"http://127.0.0.1:{port}" for port in ports]
+    os.environ["snekbox_urls"] = ",".join(urls)
+    os.environ["paste_url"] = urls[0]
+    os.environ["paste_dir"] = tempfile.mkdtemp(prefix="pybot-bench-")
+    os.environ["paste_port"] = str(args.port + args.backends)
+    os.environ["paste_public_url"] = f"http://127.0.0.1:{args.port + args.backends}"
+
+    from discord.ext import commands
+
+    from cogs.snekbox import Snekbox
+
+    bot = commands.Bot(command_prefix="!")
+    cog = Snekbox(bot)
+    cog.probe_backends.cancel()
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies, errors = [], 0
+
+    async def one_eval() -> None:
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                code = cog.prepare_input(MESSAGE)
+                results = await cog.post_eval(code)
+                await cog.format_output(results["stdout"])
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                errors += 1
+            else:
+                latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one_eval() for _ in range(args.evals)))
+    elapsed = time.perf_counter() - start
+
+    cog.cog_unload()
+    await asyncio.sleep(0)  # Let the cleanup tasks scheduled by the cog run
+    await runner.cleanup()
+
+    print(
+        f"{args.evals} evals, concurrency {args.concurrency}, {args.backends} backend(s): "
+        f"{len(latencies) / elapsed:.1f} evals/s, {errors} errors"
+    )
+    if len(latencies) >= 2:
+        percentiles = statistics.quantiles(latencies, n=100)
+        print(
+            f"latency p50 {percentiles[49] * 1000:.1f} ms"
+            f" | p95 {percentiles[94] * 1000:.1f} ms"
+            f" | p99 {percentiles[98] * 1000:.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--evals", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--backends", type=int, default=1, help="fake backends")
+    parser.add_argument("--port", type=int, default=18060)
+    add_arguments(parser)
+    asyncio.run(run_benchmark(parser.parse_args()))
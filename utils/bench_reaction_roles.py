@@ -0,0 +1,161 @@
+"""
+Count the API requests the reaction role listeners make per 1000 reactions, against a fake HTTP
+client, comparing the current listeners with the previous fetch-every-member ones.
+Run with `python -m utils.bench_reaction_roles`.
+"""
+import asyncio
+import typing as t
+from collections import Counter
+
+import discord
+from discord.ext import commands
+
+from utils.reaction_roles import DEFAULT_MENUS, ReactionRoleRegistry
+from utils.role_batcher import RoleBatcher
+
+GUILD_ID = 1
+BOT_ID = 10**6
+MENU = DEFAULT_MENUS[0]
+REACTIONS = 1000
+# Users in a verification wave often click several roles of the same menu
+CLICKS_PER_USER = 4
+
+
+class CountingHTTP:
+    """Stands in for `bot.http.request`, recording the route of every request."""
+
+    def __init__(self) -> None:
+        self.routes = Counter()
+        self.payloads = []
+
+    async def request(self, route, **kwargs) -> t.Any:
+        self.routes[f"{route.method} {route.path}"] += 1
+        self.payloads.append(kwargs.get("json"))
+        await asyncio.sleep(0.001)
+        if route.method == "GET" and route.path.endswith("/members/{member_id}"):
+            return member_data(int(route.url.rsplit("/", 1)[1]))
+        return None
+
+
+def role_data(role_id: int, name: str) -> dict:
+    return {"id": role_id, "name": name, "permissions": "0", "position": 0}
+
+
+def member_data(user_id: int) -> dict:
+    # Everyone starts with the even roles of the menu, so both adds and removes change something
+    return {
+        "user": {
+            "id": user_id,
+            "username": f"user{user_id}",
+            "discriminator": "0001",
+            "avatar": None,
+        },
+        "roles": [entry["role_id"] for entry in MENU["entries"][::2]],
+        "joined_at": "2021-03-13T00:00:00+00:00",
+        "deaf": False,
+        "mute": False,
+    }
+
+
+def make_bot(
+    cached_members: bool,
+) -> t.Tuple[commands.Bot, discord.Guild, CountingHTTP]:
+    bot = commands.Bot(command_prefix="!")
+    state = bot._connection
+    http = CountingHTTP()
+    bot.http.request = http.request
+    state.user = discord.ClientUser(
+        state=state, data={**member_data(BOT_ID)["user"], "bot": True}
+    )
+
+    guild = discord.Guild(
+        data={
+            "id": GUILD_ID,
+            "name": "bench",
+            "roles": [role_data(GUILD_ID, "@everyone")]
+            + [
+                role_data(entry["role_id"], entry["label"]) for entry in MENU["entries"]
+            ],
+            "member_count": 0,
+        },
+        state=state,
+    )
+    state._add_guild(guild)
+    if cached_members:
+        for user_id in range(REACTIONS // CLICKS_PER_USER):
+            guild._add_member(
+                discord.Member(data=member_data(user_id), guild=guild, state=state)
+            )
+    return bot, guild, http
+
+
+def make_payloads(guild: discord.Guild, event_type: str) -> t.List[t.Any]:
+    payloads = []
+    for i in range(REACTIONS):
+        user_id = i // CLICKS_PER_USER
+        entry = MENU["entries"][i % len(MENU["entries"])]
+        emoji = discord.PartialEmoji.from_dict(
+            {"id": entry["emoji"].split(":")[2][:-1], "name": "emoji"}
+        )
+        data = {
+            "message_id": MENU["message_id"],
+            "channel_id": 2,
+            "user_id": user_id,
+            "guild_id": GUILD_ID,
+        }
+        payload = discord.RawReactionActionEvent(data, emoji, event_type)
+        if event_type == "REACTION_ADD":
+            payload.member = guild.get_member(user_id)
+        payloads.append(payload)
+    return payloads
+
+
+async def legacy_listener(bot: commands.Bot, payload: t.Any) -> None:
+    """How the listeners worked before: fetch the member every time, then add the role."""
+    guild = bot.get_guild(payload.guild_id)
+    user = await guild.fetch_member(payload.user_id)
+    role = guild.get_role(819939970869231666) or discord.Object(id=819939970869231666)
+    await user.add_roles(role)
+
+
+async def run(label: str, cached_members: bool, event_type: str, legacy: bool) -> None:
+    from cogs.reaction_roles import ReactionRoles
+
+    bot, guild, http = make_bot(cached_members)
+    # Skip __init__, the registry is filled here rather than loaded from the database
+    cog = ReactionRoles.__new__(ReactionRoles)
+    cog.bot = bot
+    cog.registry = ReactionRoleRegistry(None)
+    cog.registry._index(DEFAULT_MENUS)
+    cog.batcher = RoleBatcher(window=0.1)
+
+    if legacy:
+        listener = lambda payload: legacy_listener(bot, payload)  # noqa: E731
+    elif event_type == "REACTION_ADD":
+        listener = cog.on_raw_reaction_add
+    else:
+        listener = cog.on_raw_reaction_remove
+
+    await asyncio.gather(*(listener(p) for p in make_payloads(guild, event_type)))
+    # Let the batched role edits go out
+    await asyncio.sleep(cog.batcher.window * 2)
+    if cog.batcher._queue is not None:
+        await cog.batcher._queue.join()
+    cog.batcher.close()
+    total = sum(http.routes.values())
+    print(f"{label:<42} {total:>5} requests per {REACTIONS} reactions")
+    for route, count in http.routes.most_common():
+        print(f"    {count:>5}  {route}")
+
+
+async def main() -> None:
+    await run("before (fetch_member on every reaction)", True, "REACTION_ADD", True)
+    await run("add, member in the payload", True, "REACTION_ADD", False)
+    await run("remove, member from the cache", True, "REACTION_REMOVE", False)
+    await run(
+        "remove, nobody cached (coalesced fetch)", False, "REACTION_REMOVE", False
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,196 @@
+import asyncio
+import hashlib
+import math
+import sqlite3
+import typing as t
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import aiohttp
+import discord
+
+# Bytes are handed to the hashing thread in batches of this size, not per network chunk
+HASH_BATCH_BYTES = 1024 * 1024
+# Attachments larger than this aren't hashed. Hashing downloads the whole file, so this bounds
+# the traffic of every checked attachment; known-bad files shared in chats are small
+MAX_HASH_BYTES = 8 * 1024 * 1024
+
+
+class BloomFilter:
+    """
+    A set of SHA-256 digests which may answer "maybe" for digests that were never added,
+    with a probability of about `error_rate` at `capacity`, but never misses one that was.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.001) -> None:
+        self.capacity = max(capacity, 1)
+        self.error_rate = error_rate
+        self.size = math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.hash_count = max(round(self.size / self.capacity * math.log(2)), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, digest: bytes) -> t.Iterator[int]:
+        # The digest is already uniformly distributed, so two halves of it are enough to
+        # derive every position with double hashing
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:16], "little") | 1
+        for i in range(self.hash_count):
+            yield (first + i * second) % self.size
+
+    def add(self, digest: bytes) -> None:
+        for position in self._positions(digest):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, digest: bytes) -> bool:
+        return all(
+            self.bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(digest)
+        )
+
+
+class HashBlocklist:
+    """
+    SHA-256 digests of known-bad files, stored in an SQLite database.
+    Every digest is also kept in a bloom filter, so the database is only queried for the rare
+    files the filter can't rule out. All database access goes through a single thread.
+    """
+
+    def __init__(self, path: str, error_rate: float = 0.001) -> None:
+        self.path = path
+        self.error_rate = error_rate
+        self.bloom = BloomFilter(0, error_rate)
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._db: t.Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> None:
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS hashes ("
+            "digest BLOB PRIMARY KEY, added_by INTEGER, reason TEXT, added_at TEXT)"
+        )
+        self._db.commit()
+
+    def _all_digests(self) -> t.List[bytes]:
+        return [row[0] for row in self._db.execute("SELECT digest FROM hashes")]
+
+    def _rebuild(self, digests: t.Iterable[bytes], count: int) -> None:
+        # Leave room to grow, so the filter isn't rebuilt on every addition
+        bloom = BloomFilter(max(count * 2, 1024), self.error_rate)
+        for digest in digests:
+            bloom.add(digest)
+        self.bloom = bloom
+
+    async def _run(self, func: t.Callable, *args) -> t.Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    async def load(self) -> None:
+        """Open the database and fill the bloom filter with its digests."""
+        await self._run(self._connect)
+        digests = await self._run(self._all_digests)
+        self._rebuild(digests, len(digests))
+
+    def _lookup(self, digest: bytes) -> bool:
+        query = "SELECT 1 FROM hashes WHERE digest = ?"
+        return self._db.execute(query, (digest,)).fetchone() is not None
+
+    async def contains(self, digest: bytes) -> bool:
+        if digest not in self.bloom:
+            return False
+        return await self._run(self._lookup, digest)
+
+    def _insert(self, digest: bytes, added_by: int, reason: str) -> bool:
+        cursor = self._db.execute(
+            "INSERT OR IGNORE INTO hashes VALUES (?, ?, ?, ?)",
+            (digest, added_by, reason, datetime.utcnow().isoformat()),
+        )
+        self._db.commit()
+        return cursor.rowcount == 1
+
+    async def add(self, digest: bytes, added_by: int, reason: str = "") -> bool:
+        """Add `digest` to the blocklist, return False if it was already in it."""
+        added = await self._run(self._insert, digest, added_by, reason)
+        if added:
+            if self.bloom.count >= self.bloom.capacity:
+                digests = await self._run(self._all_digests)
+                self._rebuild(digests, len(digests))
+            else:
+                self.bloom.add(digest)
+        return added
+
+    def _delete(self, digest: bytes) -> bool:
+        cursor = self._db.execute("DELETE FROM hashes WHERE digest = ?", (digest,))
+        self._db.commit()
+        return cursor.rowcount == 1
+
+    async def remove(self, digest: bytes) -> bool:
+        """
+        Remove `digest` from the blocklist, return False if it wasn't in it.
+        The bloom filter can't forget it, which only costs a database lookup when it's seen again.
+        """
+        return await self._run(self._delete, digest)
+
+    def close(self) -> None:
+        if self._db is not None:
+            self._executor.submit(self._db.close)
+        self._executor.shutdown(wait=False)
+
+
+async def hash_url(
+    session: aiohttp.ClientSession, url: str, max_size: int = MAX_HASH_BYTES
+) -> t.Optional[bytes]:
+    """
+    Stream the file at `url` into SHA-256 and return its digest, or None if it's over `max_size`.
+    The hashing itself runs in the default executor, a batch at a time as the file is downloaded.
+    """
+    loop = asyncio.get_running_loop()
+    sha256 = hashlib.sha256()
+    batch, size = bytearray(), 0
+
+    timeout = aiohttp.ClientTimeout(total=60)
+    async with session.get(url, timeout=timeout) as resp:
+        resp.raise_for_status()
+        if (resp.content_length or 0) > max_size:
+            return None
+        async for chunk in resp.content.iter_chunked(64 * 1024):
+            size += len(chunk)
+            if size > max_size:
+                return None
+            batch += chunk
+            if len(batch) >= HASH_BATCH_BYTES:
+                await loop.run_in_executor(None, sha256.update, bytes(batch))
+                batch.clear()
+    if batch:
+        await loop.run_in_executor(None, sha256.update, bytes(batch))
+    return sha256.digest()
+
+
+async def find_blocklisted(
+    session: aiohttp.ClientSession,
+    blocklist: HashBlocklist,
+    attachments: t.Iterable[discord.Attachment],
+) -> t.List[str]:
+    """
+    Hash `attachments` concurrently and return the filenames of those on the blocklist.
+    Unlike sniffing, this downloads every attachment in full (up to `MAX_HASH_BYTES`), so nothing
+    is downloaded while the blocklist is empty.
+    """
+    if blocklist.bloom.count == 0:
+        return []
+    attachments = [
+        attachment for attachment in attachments if attachment.size <= MAX_HASH_BYTES
+    ]
+    digests = await asyncio.gather(
+        *(hash_url(session, attachment.url) for attachment in attachments),
+        return_exceptions=True,
+    )
+
+    found = []
+    for attachment, digest in zip(attachments, digests):
+        if isinstance(digest, Exception) or digest is None:
+            continue  # Not being able to check a file is no reason to delete it
+        if await blocklist.contains(digest):
+            found.append(attachment.filename)
+    return found
@@ -1,36 +1,84 @@
+import asyncio
 import functools
+import time
 from collections import OrderedDict
-from typing import Any, Callable
+from typing import Any, Callable, Optional
 
 
 class AsyncCache:
     """
     LRU cache implementation for coroutines.
-    Once the cache exceeds the maximum size, keys are deleted in FIFO order.
-    An offset may be optionally provided to be applied to the coroutine's arguments when creating the cache key.
+    Once the cache exceeds the maximum size, the least recently used keys are deleted first.
+    If a `ttl` is given, entries older than `ttl` seconds are treated as missing.
+    Concurrent calls with the same key share a single call of the coroutine.
+    An offset may be optionally provided to be applied to the coroutine's arguments when creating the cache key,
+    and a `key` callable to build the cache key from the remaining arguments.
     """
 
-    def __init__(self, max_size: int = 128):
-        self._cache = OrderedDict()
+    def __init__(self, max_size: int = 128, ttl: Optional[float] = None):
+        self._cache = OrderedDict()  # key -> (value, time of expiry or None)
+        # key -> [task of the call currently computing the value, callers waiting on it]
+        self._pending = {}
         self._max_size = max_size
+        self._ttl = ttl
 
-    def __call__(self, arg_offset: int = 0) -> Callable:
-        """Decorator for async cache."""
+    def __call__(
+        self,
+        arg_offset: int = 0,
+        key: Callable = None,
+        should_cache: Callable[[Any], bool] = None,
+    ) -> Callable:
+        """
+        Decorator for async cache.
+        Values for which `should_cache` returns False are handed to the callers waiting on the
+        call, but not kept.
+        """
 
         def decorator(function: Callable) -> Callable:
             """Define the async cache decorator."""
 
+            async def run(cache_key: Any, args: tuple) -> Any:
+                try:
+                    value = await function(*args)
+                finally:
+                    pending = self._pending.get(cache_key)
+                    if pending is not None and pending[0] is asyncio.current_task():
+                        del self._pending[cache_key]
+
+                if should_cache is None or should_cache(value):
+                    expires_at = time.monotonic() + self._ttl if self._ttl else None
+                    self._cache[cache_key] = (value, expires_at)
+                    while len(self._cache) > self._max_size:
+                        self._cache.popitem(last=False)
+                return value
+
             @functools.wraps(function)
             async def wrapper(*args) -> Any:
                 """Decorator wrapper for the caching logic."""
-                key = args[arg_offset:]
+                cache_key = key(*args[arg_offset:]) if key else args[arg_offset:]
 
-                if key not in self._cache:
-                    if len(self._cache) > self._max_size:
-                        self._cache.popitem(last=False)
+                if cache_key in self._cache:
+                    value, expires_at = self._cache[cache_key]
+                    if expires_at is None or expires_at > time.monotonic():
+                        self._cache.move_to_end(cache_key)
+                        return value
+                    del self._cache[cache_key]
 
-                    self._cache[key] = await function(*args)
-                return self._cache[key]
+                pending = self._pending.get(cache_key)
+                if pending is None:
+                    # The call runs in its own task, so it doesn't belong to the first caller
+                    task = asyncio.ensure_future(run(cache_key, args))
+                    pending = self._pending[cache_key] = [task, 0]
+                task = pending[0]
+                pending[1] += 1
+                try:
+                    # Shielded so a caller getting cancelled doesn't cancel the shared call
+                    return await asyncio.shield(task)
+                finally:
+                    pending[1] -= 1
+                    if pending[1] == 0 and not task.done():
+                        # Nobody is waiting for the result anymore
+                        task.cancel()
 
             return wrapper
 
@@ -21,13 +21,6 @@ from discord.utils import DISCORD_EPOCH, snowflake_time
 DISCORD_EPOCH_DT = datetime.utcfromtimestamp(DISCORD_EPOCH / 1000)
 RE_USER_MENTION = re.compile(r"<@!?([0-9]+)>$")
 
-moderation = [
-    790221089786822657,
-    795937707263000596,
-    790219985229709342,
-    794402650569310239,
-]
-
 
 def allowed_strings(*values, preserve_case: bool = False) -> t.Callable[[str], str]:
     """
@@ -0,0 +1,98 @@
+import re
+import typing as t
+from difflib import SequenceMatcher
+
+from discord.utils import escape_markdown
+
+TOKEN_REGEX = re.compile(r"\s+|\S+")
+
+# Amount of unchanged words kept around each change in the compact diff
+CONTEXT_WORDS = 3
+
+
+def _tokenize(text: str) -> t.List[str]:
+    """Split `text` into words and the whitespace between them, so joining gives `text` back."""
+    return TOKEN_REGEX.findall(text)
+
+
+def _collapse(tokens: t.List[str], head: bool, tail: bool) -> str:
+    """
+    Shorten an unchanged run of tokens to `CONTEXT_WORDS` words of context.
+    `head` keeps context at the start of the run (after a change), `tail` at its end (before one).
+    """
+    words = [i for i, token in enumerate(tokens) if not token.isspace()]
+    if len(words) <= CONTEXT_WORDS * 2:
+        return "".join(tokens).strip()
+
+    start = "".join(tokens[: words[CONTEXT_WORDS - 1] + 1]) if head else ""
+    end = "".join(tokens[words[-CONTEXT_WORDS] :]) if tail else ""
+    return f"{start.strip()} … {end.strip()}".strip()
+
+
+def _render(markup: str, text: str) -> str:
+    return f"{markup}{escape_markdown(text)}{markup}"
+
+
+def _fit(
+    pieces: t.List[t.Tuple[str, str]], limit: t.Optional[int]
+) -> t.Tuple[str, bool]:
+    """
+    Join the `(markup, text)` pieces of a compact diff into at most `limit` characters.
+    Pieces are only ever cut between words and inside their markup, so a truncated diff never
+    leaves a `~~` or `**` span open. Return the text and whether it was truncated.
+    """
+    rendered, size = [], 0
+    for markup, text in pieces:
+        separator = 1 if rendered else 0
+        piece = _render(markup, text)
+        if limit is None or size + separator + len(piece) <= limit:
+            rendered.append(piece)
+            size += separator + len(piece)
+            continue
+
+        # Keep as many whole words of the overflowing piece as fit
+        words = text[: max(limit - size, 0)].split(" ")[:-1]
+        while words:
+            piece = _render(markup, " ".join(words) + " …")
+            if size + separator + len(piece) <= limit:
+                rendered.append(piece)
+                break
+            words.pop()
+        return " ".join(rendered), True
+    return " ".join(rendered), False
+
+
+def word_diff(
+    before: str, after: str, limit: t.Optional[int] = None
+) -> t.Tuple[str, str, bool]:
+    """
+    Return a compact word-level diff of `before` -> `after`.
+    The first element is rendered with markdown for an embed: removed words are struck through
+    and added words are bold, while long unchanged stretches are collapsed. It is truncated to
+    `limit` characters, between words, which the third element tells. The second element is the
+    full, uncollapsed diff in `[-removed-]{+added+}` notation, suitable for a text file.
+    This can be slow on large inputs, so callers on the event loop should use an executor.
+    """
+    a, b = _tokenize(before), _tokenize(after)
+    opcodes = SequenceMatcher(None, a, b, autojunk=False).get_opcodes()
+
+    # (markup, unescaped text) of every part of the compact diff
+    pieces, full = [], []
+    for index, (tag, i1, i2, j1, j2) in enumerate(opcodes):
+        old, new = "".join(a[i1:i2]), "".join(b[j1:j2])
+        if tag == "equal":
+            full.append(old)
+            context = _collapse(a[i1:i2], head=index > 0, tail=index < len(opcodes) - 1)
+            if context:
+                pieces.append(("", context))
+            continue
+
+        if old.strip():
+            full.append(f"[-{old}-]")
+            pieces.append(("~~", old.strip()))
+        if new.strip():
+            full.append(f"{{+{new}+}}")
+            pieces.append(("**", new.strip()))
+
+    compact, truncated = _fit(pieces, limit)
+    return compact, "".join(full), truncated
@@ -0,0 +1,142 @@
+import asyncio
+import itertools
+import logging
+import typing as t
+from contextlib import suppress
+
+import discord
+
+log = logging.getLogger(__name__)
+
+# Discord can bulk delete at most this many messages in one request
+BULK_DELETE_LIMIT = 100
+
+DELETE_PRIORITY = 0
+WARNING_PRIORITY = 1
+
+
+class _Warning:
+    __slots__ = ("author", "channel", "descriptions", "count", "handle")
+
+    def __init__(self, author: discord.abc.User, channel: discord.TextChannel) -> None:
+        self.author = author
+        self.channel = channel
+        # A dict keeps the descriptions unique and in order
+        self.descriptions: t.Dict[str, None] = {}
+        self.count = 0
+        self.handle: t.Optional[asyncio.TimerHandle] = None
+
+
+class Enforcer:
+    """
+    Delete offending messages and warn their authors without flooding the API.
+    Deletions and warnings are jobs in one priority queue, drained concurrently by a fixed number
+    of `workers`, deletions first. Messages waiting to be deleted in the same channel are removed
+    with a single bulk delete. The warnings for a (user, channel) pair are collected for `window`
+    seconds and sent as one embed. At most `max_warnings` warnings are collected or waiting to be
+    sent, new ones are dropped when full; the deletions still go through. The queue so holds at
+    most one deletion job per channel and `max_warnings` warnings.
+    """
+
+    def __init__(
+        self, window: float = 2.0, workers: int = 3, max_warnings: int = 50
+    ) -> None:
+        self.window = window
+        self.worker_count = workers
+        self.max_warnings = max_warnings
+
+        self._queue: t.Optional[asyncio.PriorityQueue] = None
+        self._workers: t.List[asyncio.Task] = []
+        # Breaks ties in the queue, so jobs of the same priority run in order
+        self._sequence = itertools.count()
+        # channel_id -> messages waiting for the channel's next deletion job
+        self._deletions: t.Dict[int, t.List[discord.Message]] = {}
+        # (user_id, channel_id) -> warning being collected
+        self._warnings: t.Dict[t.Tuple[int, int], _Warning] = {}
+        self._queued_warnings = 0
+
+    def _start(self) -> None:
+        # Created on first use, the queue needs the running loop
+        if self._queue is None:
+            self._queue = asyncio.PriorityQueue()
+            self._workers = [
+                asyncio.create_task(self._work()) for _ in range(self.worker_count)
+            ]
+
+    def _put(self, priority: int, job: t.Callable[[], t.Awaitable[None]]) -> None:
+        self._queue.put_nowait((priority, next(self._sequence), job))
+
+    def report(self, message: discord.Message, description: str) -> None:
+        """Delete `message` and warn its author with `description`."""
+        self._start()
+
+        channel = message.channel
+        pending = self._deletions.get(channel.id)
+        if pending is not None:
+            # A deletion job is already queued for this channel and will pick it up
+            pending.append(message)
+        else:
+            self._deletions[channel.id] = [message]
+            self._put(DELETE_PRIORITY, lambda: self._delete(channel))
+
+        key = (message.author.id, channel.id)
+        warning = self._warnings.get(key)
+        if warning is None:
+            if len(self._warnings) + self._queued_warnings >= self.max_warnings:
+                log.warning(
+                    f"Dropped a warning for '{message.author}' ({message.author.id}), too many are queued."
+                )
+                return
+            warning = self._warnings[key] = _Warning(message.author, channel)
+            loop = asyncio.get_running_loop()
+            warning.handle = loop.call_later(self.window, self._queue_warning, key)
+        warning.descriptions[description] = None
+        warning.count += 1
+
+    def _queue_warning(self, key: t.Tuple[int, int]) -> None:
+        warning = self._warnings.pop(key)
+        self._queued_warnings += 1
+        self._put(WARNING_PRIORITY, lambda: self._warn(warning))
+
+    async def _delete(self, channel: discord.TextChannel) -> None:
+        messages = self._deletions.pop(channel.id, [])
+        for start in range(0, len(messages), BULK_DELETE_LIMIT):
+            batch = messages[start : start + BULK_DELETE_LIMIT]
+            if len(batch) > 1:
+                with suppress(discord.HTTPException):
+                    await channel.delete_messages(batch)
+                    continue
+            # Single messages, or a batch the bulk delete refused
+            for message in batch:
+                try:
+                    await message.delete()
+                except discord.NotFound:
+                    log.info(
+                        f"Tried to delete message `{message.id}`, but message could not be found."
+                    )
+
+    async def _warn(self, warning: _Warning) -> None:
+        self._queued_warnings -= 1
+        embed = discord.Embed(description="\n\n".join(warning.descriptions))
+        if warning.count > 1:
+            embed.set_footer(text=f"{warning.count} messages were removed.")
+        await warning.channel.send(f"Hey {warning.author.mention}!", embed=embed)
+
+    async def _work(self) -> None:
+        while True:
+            _, _, job = await self._queue.get()
+            try:
+                await job()
+            except discord.HTTPException as e:
+                log.warning(f"Enforcement action failed: {e}")
+            except Exception:
+                # Anything else would kill the worker, and the queue with it once all are gone
+                log.exception("Enforcement action failed")
+            finally:
+                self._queue.task_done()
+
+    def close(self) -> None:
+        for warning in self._warnings.values():
+            warning.handle.cancel()
+        for worker in self._workers:
+            worker.cancel()
@@ -0,0 +1,96 @@
+"""
+Fake snekbox and hastebin server for testing and benchmarking the eval pipeline offline.
+Run with `python -m utils.fake_snekbox --help` to see the options.
+"""
+import argparse
+import asyncio
+import random
+import uuid
+
+from aiohttp import web
+
+
+def make_output(lines: int, chars: int) -> str:
+    """Build `lines` lines of output adding up to roughly `chars` characters."""
+    if lines <= 0:
+        return ""
+    width = max(chars // lines - 1, 1)
+    return "\n".join(f"{i:>6} ".ljust(width, "x")[:width] for i in range(lines))
+
+
+def make_app(
+    latency: float = 0.05,
+    jitter: float = 0.0,
+    error_rate: float = 0.0,
+    output_lines: int = 1,
+    output_chars: int = 20,
+    returncode: int = 0,
+) -> web.Application:
+    """
+    Create an app imitating snekbox's `POST /eval` and hastebin's `POST /documents` / `GET /<key>`.
+    Every eval answers after `latency` (+- `jitter`) seconds with the same generated output, and
+    fails with a 500 error for `error_rate` of the requests.
+    """
+    output = make_output(output_lines, output_chars)
+    pastes = {}
+
+    async def handle_eval(request: web.Request) -> web.Response:
+        body = await request.json()
+        if "input" not in body:
+            raise web.HTTPBadRequest(text="Missing input")
+
+        await asyncio.sleep(max(latency + random.uniform(-jitter, jitter), 0))
+        if random.random() < error_rate:
+            raise web.HTTPInternalServerError(text="Simulated sandbox failure")
+        return web.json_response({"stdout": output, "returncode": returncode})
+
+    async def handle_post_document(request: web.Request) -> web.Response:
+        key = uuid.uuid4().hex[:16]
+        pastes[key] = await request.read()
+        return web.json_response({"key": key})
+
+    async def handle_get_document(request: web.Request) -> web.Response:
+        key = request.match_info["key"]
+        if key not in pastes:
+            raise web.HTTPNotFound()
+        return web.Response(body=pastes[key], content_type="text/plain")
+
+    app = web.Application(client_max_size=16 * 1024 * 1024)
+    app.add_routes(
+        [
+            web.post("/eval", handle_eval),
+            web.post("/documents", handle_post_document),
+            web.get("/{key}", handle_get_document),
+        ]
+    )
+    return app
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add the options of the fake server to `parser`, shared with `utils.bench_eval`."""
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per eval")
+    parser.add_argument("--jitter", type=float, default=0.0, help="+- seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="0 to 1")
+    parser.add_argument("--output-lines", type=int, default=1)
+    parser.add_argument("--output-chars", type=int, default=20)
+    parser.add_argument("--returncode", type=int, default=0)
+
+
+def app_from_args(args: argparse.Namespace) -> web.Application:
+    return make_app(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        output_lines=args.output_lines,
+        output_chars=args.output_chars,
+        returncode=args.returncode,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8060)
+    add_arguments(parser)
+    args = parser.parse_args()
+    web.run_app(app_from_args(args), host=args.host, port=args.port)
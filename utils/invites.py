@@ -0,0 +1,135 @@
+import asyncio
+import typing as t
+from collections import defaultdict
+
+import discord
+
+
+class InviteTracker:
+    """
+    Per-guild in-memory cache of invite use counts, used to find out which invite a member joined with.
+    The cache is seeded once with `seed` and kept up to date from the invite create/delete events.
+    Attributing joins needs a fresh `guild.invites()` listing, but members joining in the same
+    burst (within `window` seconds) share a single fetch: the new use counts are diffed against the
+    cache once. The listing doesn't tell which member used which invite, so when a burst used
+    several different invites each of its members gets all of them as candidates.
+    """
+
+    def __init__(self, window: float = 1.0) -> None:
+        self.window = window
+
+        # guild_id -> {invite code: invite}, the invite's `uses` is the last known use count
+        self._invites: t.Dict[int, t.Dict[str, discord.Invite]] = {}
+        # guild_id -> [(member, future), ...] waiting for the next invite fetch
+        self._waiting: t.DefaultDict[int, list] = defaultdict(list)
+        self._fetchers: t.Dict[int, asyncio.Task] = {}
+
+    def is_seeded(self, guild: discord.Guild) -> bool:
+        """Whether the invites of `guild` are already cached."""
+        return guild.id in self._invites
+
+    async def seed(self, guild: discord.Guild) -> None:
+        """Fetch and cache the invites of `guild`, if the bot is allowed to see them."""
+        if not guild.me.guild_permissions.manage_guild:
+            return
+
+        try:
+            invites = await guild.invites()
+        except discord.HTTPException as e:
+            print(f"[ Log ] Could not fetch invites of {guild}: {e}")
+            return
+        self._invites[guild.id] = {invite.code: invite for invite in invites}
+
+    def add(self, invite: discord.Invite) -> None:
+        """Cache a freshly created invite."""
+        if invite.guild is not None and invite.guild.id in self._invites:
+            invite.uses = invite.uses or 0
+            self._invites[invite.guild.id][invite.code] = invite
+
+    def remove(self, invite: discord.Invite) -> None:
+        """Forget a deleted invite."""
+        if invite.guild is None:
+            return
+
+        cached = self._invites.get(invite.guild.id, {})
+        previous = cached.get(invite.code)
+        # An invite deleted for reaching its max uses is kept until the next fetch so that the
+        # join which used it up can still be attributed (see `_diff`)
+        if previous and previous.max_uses and previous.uses + 1 == previous.max_uses:
+            return
+        cached.pop(invite.code, None)
+
+    async def attribute(self, member: discord.Member) -> t.List[discord.Invite]:
+        """
+        Return the invites `member` may have joined with: a single one when it is known, several
+        when the attribution is ambiguous, none when it can't be told.
+        """
+        guild = member.guild
+        if guild.id not in self._invites:
+            return []
+
+        future = asyncio.get_event_loop().create_future()
+        self._waiting[guild.id].append((member, future))
+        if guild.id not in self._fetchers:
+            self._fetchers[guild.id] = asyncio.create_task(self._resolve(guild))
+        return await future
+
+    async def _resolve(self, guild: discord.Guild) -> None:
+        """Fetch the invites once for everyone who joined during the window."""
+        try:
+            await asyncio.sleep(self.window)
+        finally:
+            self._fetchers.pop(guild.id, None)
+            waiting = self._waiting.pop(guild.id, [])
+
+        try:
+            invites = await guild.invites()
+        except discord.HTTPException as e:
+            print(f"[ Log ] Could not fetch invites of {guild}: {e}")
+            invites = None
+
+        used = []
+        if invites is not None:
+            used = self._diff(self._invites.get(guild.id, {}), invites)
+            self._invites[guild.id] = {invite.code: invite for invite in invites}
+
+        # Once per invite, in listing order
+        candidates = list({invite.code: invite for invite in used}.values())
+        for member, future in waiting:
+            if not future.done():
+                future.set_result(candidates)
+
+    @staticmethod
+    def _diff(
+        cached: t.Dict[str, discord.Invite], invites: t.List[discord.Invite]
+    ) -> t.List[discord.Invite]:
+        """
+        Return one entry per detected use, comparing the new listing to the cached use counts.
+        Invites which reached their max uses get deleted by Discord, so a cached invite that is one
+        use away from its limit and no longer listed is counted as used once.
+        """
+        used = []
+        for invite in invites:
+            previous = cached.get(invite.code)
+            delta = invite.uses - (previous.uses if previous else 0)
+            used.extend([invite] * max(delta, 0))
+
+        codes = {invite.code for invite in invites}
+        for code, invite in cached.items():
+            if (
+                code not in codes
+                and invite.max_uses
+                and invite.uses + 1 == invite.max_uses
+            ):
+                used.append(invite)
+        return used
+
+    def cancel(self) -> None:
+        """Cancel all scheduled fetches, used when the cog gets unloaded."""
+        for task in self._fetchers.values():
+            task.cancel()
+        self._fetchers.clear()
+        for waiting in self._waiting.values():
+            for _, future in waiting:
+                future.cancel()
+        self._waiting.clear()
@@ -7,13 +7,6 @@ import discord
 from discord.errors import HTTPException
 from discord.ext.commands import Context
 
-moderation = [
-    790221089786822657,
-    795937707263000596,
-    790219985229709342,
-    794402650569310239,
-]
-
 NEGATIVE_REPLIES = ["Something wrong went", "Facing some issues"]
 
 
@@ -1,12 +1,17 @@
 import asyncio
+import bisect
+import copy
 import typing as t
+from collections import OrderedDict
 from contextlib import suppress
 
 import discord
-from discord import Member
 from discord.abc import User
 from discord.ext.commands import Context, Paginator
 
+from utils.privileges import is_moderator
+from utils.reaction_router import get_router
+
 FIRST_EMOJI = "\u23EE"  # [:track_previous:]
 LEFT_EMOJI = "\u2B05"  # [:arrow_left:]
 RIGHT_EMOJI = "\u27A1"  # [:arrow_right:]
@@ -15,13 +20,11 @@ DELETE_EMOJI = "\U0001f1e9"
 
 PAGINATION_EMOJI = (FIRST_EMOJI, LEFT_EMOJI, RIGHT_EMOJI, LAST_EMOJI, DELETE_EMOJI)
 
+# Pages kept around by a paginator over a sequence, the others are rebuilt when navigated back to
+PAGE_CACHE_SIZE = 5
 
-moderation = [
-    790221089786822657,
-    795937707263000596,
-    790219985229709342,
-    794402650569310239,
-]
+# Building many pages in a row (jumping to the last one) hands control back to the loop this often
+PAGES_PER_YIELD = 20
 
 
 class EmptyPaginatorEmbed(Exception):
@@ -30,6 +33,143 @@ class EmptyPaginatorEmbed(Exception):
     pass
 
 
+class LazyPages:
+    """
+    The pages of a `LinePaginator`, built from `lines` only when they are first asked for.
+    `lines` may be a list, an iterator or an async iterator, it is read one page at a time.
+    The last `cache_size` pages are kept. Pages of a sequence are rebuilt from it when needed again,
+    only where every page starts is remembered. An iterator can't be read twice, so the pages built
+    from one are all kept: navigating to its last page holds the whole of it in memory.
+    """
+
+    def __init__(
+        self,
+        paginator: "LinePaginator",
+        lines: t.Union[t.Iterable[str], t.AsyncIterable[str]],
+        empty: bool = True,
+        cache_size: int = PAGE_CACHE_SIZE,
+    ) -> None:
+        self.paginator = paginator
+        self.empty = empty
+        self.cache_size = cache_size
+        self.sequence = lines if isinstance(lines, t.Sequence) else None
+        if isinstance(lines, t.AsyncIterable):
+            self._lines = lines.__aiter__()
+        else:
+            self._lines = iter(lines)
+
+        self._cache: t.OrderedDict[int, str] = OrderedDict()
+        # Pages the paginator can be restarted at: their numbers, and (lines read before them,
+        # state of the paginator) to rebuild them from
+        self._start_pages: t.List[int] = [0]
+        self._starts: t.List[t.Tuple[int, tuple]] = [(0, self._state(paginator))]
+        self._read = 0
+        self.built = 0
+        # Only known once every line has been read
+        self.total: t.Optional[int] = None
+
+    @property
+    def count(self) -> str:
+        return "?" if self.total is None else str(self.total)
+
+    @staticmethod
+    def _state(paginator: "LinePaginator") -> tuple:
+        return list(paginator._current_page), paginator._count, paginator._linecount
+
+    @staticmethod
+    def _restore(paginator: "LinePaginator", state: tuple) -> None:
+        current_page, paginator._count, paginator._linecount = state
+        paginator._current_page = list(current_page)
+        paginator._pages = []
+
+    async def _next_page(
+        self,
+        paginator: "LinePaginator",
+        lines: t.Union[t.Iterator[str], t.AsyncIterator[str]],
+    ) -> t.Tuple[t.Optional[str], int]:
+        """
+        Feed `paginator` with `lines` until it closes a page.
+        Return the page, None if the lines ran out first, and how many lines were read.
+        """
+        read = 0
+        while not paginator._pages:
+            try:
+                if isinstance(lines, t.AsyncIterator):
+                    line = await lines.__anext__()
+                else:
+                    line = next(lines)
+            except (StopIteration, StopAsyncIteration):
+                if len(paginator._current_page) <= 1:
+                    return None, read
+                paginator.close_page()
+                break
+            paginator.add_line(line, empty=self.empty)
+            read += 1
+        return paginator._pages.pop(0), read
+
+    async def _build(self) -> t.Optional[str]:
+        page, read = await self._next_page(self.paginator, self._lines)
+        self._read += read
+        if page is None:
+            self.total = self.built
+            return None
+        self.built += 1
+        # A long line split over several pages leaves the next ones queued, they can only be
+        # rebuilt from the page the line started on
+        if self.sequence is not None and not self.paginator._pages:
+            self._start_pages.append(self.built)
+            self._starts.append((self._read, self._state(self.paginator)))
+        if self.built % PAGES_PER_YIELD == 0:
+            await asyncio.sleep(0)
+        return page
+
+    async def _rebuild(self, number: int) -> str:
+        start = bisect.bisect_right(self._start_pages, number) - 1
+        page_number = self._start_pages[start]
+        read, state = self._starts[start]
+        paginator = copy.copy(self.paginator)
+        self._restore(paginator, state)
+        # Indexed from the restart point, slicing or skipping to it would go through the lines before
+        lines = (self.sequence[i] for i in range(read, len(self.sequence)))
+        while True:
+            page, _ = await self._next_page(paginator, lines)
+            if page_number == number:
+                return page
+            page_number += 1
+
+    def _remember(self, number: int, page: str) -> None:
+        self._cache[number] = page
+        self._cache.move_to_end(number)
+        if self.sequence is not None and len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def get(self, number: int) -> t.Optional[str]:
+        """Return the page `number`, counting from 0, or None if there are fewer pages."""
+        if number in self._cache:
+            self._cache.move_to_end(number)
+            return self._cache[number]
+        if number < self.built:
+            page = await self._rebuild(number)
+            self._remember(number, page)
+            return page
+
+        page = None
+        while self.built <= number:
+            page = await self._build()
+            if page is None:
+                return None
+            self._remember(self.built - 1, page)
+        return page
+
+    async def last(self) -> int:
+        """Build every remaining page and return the number of the last one."""
+        while self.total is None:
+            page = await self._build()
+            if page is not None:
+                self._remember(self.built - 1, page)
+        return self.total - 1
+
+
 class LinePaginator(Paginator):
     """
     A class that aids in paginating code blocks for Discord messages.
@@ -60,6 +200,7 @@ class LinePaginator(Paginator):
         """
         self.prefix = prefix
         self.suffix = suffix
+        self.linesep = "\n"
 
         # Embeds that exceed 2048 characters will result in an HTTPException
         # (Discord API limit), so we've set a limit of 2000
@@ -185,7 +326,7 @@ class LinePaginator(Paginator):
     @classmethod
     async def paginate(
         cls,
-        lines: t.List[str],
+        lines: t.Union[t.Iterable[str], t.AsyncIterable[str]],
         ctx: Context,
         embed: discord.Embed,
         prefix: str = "",
@@ -202,6 +343,9 @@ class LinePaginator(Paginator):
     ) -> t.Optional[discord.Message]:
         """
         Use a paginator and set of reactions to provide pagination over a set of lines.
+        `lines` may be a list, an iterator or an async iterator, pages are only built from it as
+        they are navigated to. The page count shows as "?" until the last line was read. Pages of an
+        iterator are all kept once built, pass a list to only keep a few.
         The reactions are used to switch page, or to finish with pagination.
         When used, this will send a message using `ctx.send()` and apply a set of reactions to it. These reactions may
         be used to change page, or to remove pagination from the message.
@@ -220,8 +364,7 @@ class LinePaginator(Paginator):
                 # The reaction was by a whitelisted user
                 user_.id == restrict_to_user.id
                 # The reaction was by a moderator
-                or isinstance(user_, Member)
-                and any(role.id in moderation for role in user_.roles)
+                or is_moderator(user_)
             )
 
             return (
@@ -252,23 +395,25 @@ class LinePaginator(Paginator):
         if not restrict_to_user:
             restrict_to_user = ctx.author
 
-        if not lines:
+        # Pages are built as they are navigated to, sending the first one doesn't wait for the rest
+        pages = LazyPages(paginator, lines, empty=empty)
+        first_page = await pages.get(current_page)
+        if first_page is None:
             if exception_on_empty_embed:
                 raise EmptyPaginatorEmbed("No lines to paginate")
-            lines.append("(nothing to display)")
+            pages = LazyPages(paginator, ["(nothing to display)"], empty=empty)
+            first_page = await pages.get(current_page)
 
-        for line in lines:
-            try:
-                paginator.add_line(line, empty=empty)
-            except Exception:
-                pass
-                raise  # Should propagate
-            else:
-                pass
+        embed.description = first_page
 
-        embed.description = paginator.pages[current_page]
+        def set_footer() -> None:
+            page_number = f"Page {current_page + 1}/{pages.count}"
+            if footer_text:
+                embed.set_footer(text=f"{footer_text} ({page_number})")
+            else:
+                embed.set_footer(text=page_number)
 
-        if len(paginator.pages) <= 1:
+        if await pages.get(1) is None:
             if footer_text:
                 embed.set_footer(text=footer_text)
 
@@ -276,12 +421,7 @@ class LinePaginator(Paginator):
                 embed.url = url
             return await ctx.send(embed=embed)
         else:
-            if footer_text:
-                embed.set_footer(
-                    text=f"{footer_text} (Page {current_page + 1}/{len(paginator.pages)})"
-                )
-            else:
-                embed.set_footer(text=f"Page {current_page + 1}/{len(paginator.pages)}")
+            set_footer()
 
             if url:
                 embed.url = url
@@ -292,86 +432,61 @@ class LinePaginator(Paginator):
             # Add all the applicable emoji to the message
             await message.add_reaction(emoji)
 
-        while True:
-            try:
-                reaction, user = await ctx.bot.wait_for(
-                    "reaction_add", timeout=timeout, check=event_check
-                )
-            except asyncio.TimeoutError:
-                break  # We're done, no reactions for the last 5 minutes
-
-            if str(reaction.emoji) == DELETE_EMOJI:
-                return await message.delete()
+        # Reactions are routed to this paginator by message, instead of through a wait_for
+        # check which every open paginator would run on every reaction
+        session = get_router(ctx.bot).register(message, event_check)
+        try:
+            while True:
+                try:
+                    reaction, user = await session.wait(timeout)
+                except asyncio.TimeoutError:
+                    break  # We're done, no reactions for the last 5 minutes
 
-            if reaction.emoji == FIRST_EMOJI:
-                await message.remove_reaction(reaction.emoji, user)
-                current_page = 0
+                if str(reaction.emoji) == DELETE_EMOJI:
+                    return await message.delete()
 
-                embed.description = paginator.pages[current_page]
-                if footer_text:
-                    embed.set_footer(
-                        text=f"{footer_text} (Page {current_page + 1}/{len(paginator.pages)})"
-                    )
-                else:
-                    embed.set_footer(
-                        text=f"Page {current_page + 1}/{len(paginator.pages)}"
-                    )
-                await message.edit(embed=embed)
-
-            if reaction.emoji == LAST_EMOJI:
-                await message.remove_reaction(reaction.emoji, user)
-                current_page = len(paginator.pages) - 1
-                embed.description = paginator.pages[current_page]
-                if footer_text:
-                    embed.set_footer(
-                        text=f"{footer_text} (Page {current_page + 1}/{len(paginator.pages)})"
-                    )
-                else:
-                    embed.set_footer(
-                        text=f"Page {current_page + 1}/{len(paginator.pages)}"
-                    )
-                await message.edit(embed=embed)
+                if reaction.emoji == FIRST_EMOJI:
+                    await message.remove_reaction(reaction.emoji, user)
+                    current_page = 0
 
-            if reaction.emoji == LEFT_EMOJI:
-                await message.remove_reaction(reaction.emoji, user)
+                    embed.description = await pages.get(current_page)
+                    set_footer()
+                    await message.edit(embed=embed)
 
-                if current_page <= 0:
-                    continue
+                if reaction.emoji == LAST_EMOJI:
+                    await message.remove_reaction(reaction.emoji, user)
+                    current_page = await pages.last()
+                    embed.description = await pages.get(current_page)
+                    set_footer()
+                    await message.edit(embed=embed)
 
-                current_page -= 1
+                if reaction.emoji == LEFT_EMOJI:
+                    await message.remove_reaction(reaction.emoji, user)
 
-                embed.description = paginator.pages[current_page]
+                    if current_page <= 0:
+                        continue
 
-                if footer_text:
-                    embed.set_footer(
-                        text=f"{footer_text} (Page {current_page + 1}/{len(paginator.pages)})"
-                    )
-                else:
-                    embed.set_footer(
-                        text=f"Page {current_page + 1}/{len(paginator.pages)}"
-                    )
+                    current_page -= 1
 
-                await message.edit(embed=embed)
+                    embed.description = await pages.get(current_page)
+                    set_footer()
 
-            if reaction.emoji == RIGHT_EMOJI:
-                await message.remove_reaction(reaction.emoji, user)
+                    await message.edit(embed=embed)
 
-                if current_page >= len(paginator.pages) - 1:
-                    continue
+                if reaction.emoji == RIGHT_EMOJI:
+                    await message.remove_reaction(reaction.emoji, user)
 
-                current_page += 1
+                    page = await pages.get(current_page + 1)
+                    if page is None:
+                        continue
 
-                embed.description = paginator.pages[current_page]
+                    current_page += 1
 
-                if footer_text:
-                    embed.set_footer(
-                        text=f"{footer_text} (Page {current_page + 1}/{len(paginator.pages)})"
-                    )
-                else:
-                    embed.set_footer(
-                        text=f"Page {current_page + 1}/{len(paginator.pages)}"
-                    )
+                    embed.description = page
+                    set_footer()
 
-                await message.edit(embed=embed)
+                    await message.edit(embed=embed)
+        finally:
+            session.close()
         with suppress(discord.NotFound):
             await message.clear_reactions()
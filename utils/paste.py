@@ -0,0 +1,267 @@
+import asyncio
+import hashlib
+import os
+import re
+import time
+import typing as t
+from collections import OrderedDict
+
+import aiohttp
+from aiohttp import web
+
+KEY_REGEX = re.compile(r"^[0-9a-f]{16}$")
+
+
+class PasteError(Exception):
+    """Raised when a paste could not be uploaded."""
+
+    pass
+
+
+class PasteBackend:
+    """Interface of the services output can be uploaded to."""
+
+    async def upload(self, content: str) -> str:
+        """Upload `content` and return the link to it, raising `PasteError` on failure."""
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        """Release the resources held by the backend."""
+        pass
+
+
+class CircuitBreaker:
+    """
+    Stop calling a failing service for a while.
+    After `threshold` consecutive failures the breaker opens for `cooldown` seconds, during which
+    calls should fail fast; once it is over a single call is let through to probe the service.
+    """
+
+    def __init__(self, threshold: int = 5, cooldown: float = 60.0) -> None:
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+
+    @property
+    def is_open(self) -> bool:
+        if self.opened_at is None:
+            return False
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            # Half open: allow one attempt, a failure opens the breaker again right away
+            self.opened_at = None
+            self.failures = self.threshold - 1
+            return False
+        return True
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+
+
+class HastebinPaste(PasteBackend):
+    """Upload to a hastebin compatible service over a pooled session, with retries and a circuit breaker."""
+
+    def __init__(
+        self,
+        url: str,
+        timeout: float = 10.0,
+        retries: int = 2,
+        breaker: CircuitBreaker = None,
+    ) -> None:
+        self.url = url.rstrip("/")
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.retries = retries
+        self.breaker = breaker or CircuitBreaker()
+        self._session = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(timeout=self.timeout)
+        return self._session
+
+    async def upload(self, content: str) -> str:
+        if self.breaker.is_open:
+            raise PasteError(f"{self.url} is unavailable, not trying again yet")
+
+        data = content.encode("utf-8")
+        for attempt in range(self.retries + 1):
+            try:
+                async with self._get_session().post(
+                    f"{self.url}/documents", data=data
+                ) as resp:
+                    if 400 <= resp.status < 500:
+                        # Our fault (e.g. too large), retrying won't help
+                        raise PasteError(
+                            f"{self.url} refused the paste ({resp.status})"
+                        )
+                    resp.raise_for_status()
+                    key = (await resp.json())["key"]
+            except (aiohttp.ClientError, asyncio.TimeoutError, KeyError) as e:
+                self.breaker.record_failure()
+                if attempt == self.retries or self.breaker.is_open:
+                    raise PasteError(f"Uploading to {self.url} failed: {e}") from e
+                await asyncio.sleep(0.5 * 2**attempt)
+            else:
+                self.breaker.record_success()
+                return f"{self.url}/{key}"
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+
+
+class LocalPasteStore(PasteBackend):
+    """
+    Built-in hastebin compatible paste service.
+    Pastes are stored content-addressed (the key is derived from a hash of the content) in
+    `directory`, which is kept under `max_bytes` by deleting the least recently pasted files.
+    Only the bot stores pastes, through `upload`. A small read-only aiohttp server serves them:
+    `GET /<key>` and `GET /raw/<key>` return a paste as plain text and `GET /documents/<key>`
+    as JSON. It listens on localhost by default, to be exposed through a reverse proxy.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        public_url: str,
+        host: str = "127.0.0.1",
+        port: int = 8061,
+        max_bytes: int = 256 * 1024 * 1024,
+        max_paste_bytes: int = 1024 * 1024,
+    ) -> None:
+        self.directory = directory
+        self.public_url = public_url.rstrip("/")
+        self.host = host
+        self.port = port
+        self.max_bytes = max_bytes
+        self.max_paste_bytes = max_paste_bytes
+
+        # key -> size of the paste, least recently pasted first
+        self._sizes: t.OrderedDict[str, int] = OrderedDict()
+        self._total = 0
+        # key -> write in progress, shared by concurrent stores of the same content
+        self._writing: t.Dict[str, asyncio.Future] = {}
+        self._runner = None
+
+    async def start(self) -> None:
+        """Index the pastes already on disk and start serving them."""
+        loop = asyncio.get_event_loop()
+        self._sizes = await loop.run_in_executor(None, self._scan)
+        self._total = sum(self._sizes.values())
+
+        app = web.Application()
+        app.add_routes(
+            [
+                web.get("/documents/{key}", self._handle_get_json),
+                web.get("/raw/{key}", self._handle_get),
+                web.get("/{key}", self._handle_get),
+            ]
+        )
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+
+    def _scan(self) -> t.OrderedDict[str, int]:
+        os.makedirs(self.directory, exist_ok=True)
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and KEY_REGEX.match(entry.name):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.name, stat.st_size))
+        return OrderedDict((key, size) for _, key, size in sorted(entries))
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    async def store(self, data: bytes) -> str:
+        """Store `data` and return its key, evicting old pastes if the store grows too large."""
+        if len(data) > self.max_paste_bytes:
+            end = self.max_paste_bytes
+            # Cut before a UTF-8 character rather than inside it, its continuation bytes are 10xxxxxx
+            while end > 0 and data[end] & 0xC0 == 0x80:
+                end -= 1
+            data = data[:end]
+
+        key = hashlib.sha256(data).hexdigest()[:16]
+        loop = asyncio.get_event_loop()
+        if key in self._sizes:
+            self._sizes.move_to_end(key)
+            await loop.run_in_executor(None, os.utime, self._path(key))
+            return key
+
+        writing = self._writing.get(key)
+        if writing is None:
+            writing = self._writing[key] = asyncio.ensure_future(self._add(key, data))
+            writing.add_done_callback(lambda _: self._writing.pop(key, None))
+        # Shielded, so a cancelled caller doesn't cancel the write for the others
+        await asyncio.shield(writing)
+        return key
+
+    async def _add(self, key: str, data: bytes) -> None:
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, self._write, key, data)
+        self._sizes[key] = len(data)
+        self._total += len(data)
+
+        evicted = []
+        while self._total > self.max_bytes and len(self._sizes) > 1:
+            old_key, size = self._sizes.popitem(last=False)
+            self._total -= size
+            evicted.append(old_key)
+        if evicted:
+            await loop.run_in_executor(None, self._delete, evicted)
+
+    def _write(self, key: str, data: bytes) -> None:
+        # Write to a temporary file first so a paste is never served half written
+        tmp = f"{self._path(key)}.tmp"
+        with open(tmp, "wb") as file:
+            file.write(data)
+        os.replace(tmp, self._path(key))
+
+    @staticmethod
+    def _read(path: str) -> bytes:
+        with open(path, "rb") as file:
+            return file.read()
+
+    def _delete(self, keys: t.List[str]) -> None:
+        for key in keys:
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    async def upload(self, content: str) -> str:
+        try:
+            key = await self.store(content.encode("utf-8"))
+        except OSError as e:
+            raise PasteError(f"Storing the paste failed: {e}") from e
+        return f"{self.public_url}/{key}"
+
+    def _existing_path(self, request: web.Request) -> str:
+        key = request.match_info["key"]
+        if not KEY_REGEX.match(key) or key not in self._sizes:
+            raise web.HTTPNotFound()
+        return self._path(key)
+
+    async def _handle_get(self, request: web.Request) -> web.StreamResponse:
+        return web.FileResponse(
+            self._existing_path(request),
+            headers={"Content-Type": "text/plain; charset=utf-8"},
+        )
+
+    async def _handle_get_json(self, request: web.Request) -> web.Response:
+        path = self._existing_path(request)
+        data = await asyncio.get_event_loop().run_in_executor(None, self._read, path)
+        return web.json_response(
+            {"key": request.match_info["key"], "data": data.decode("utf-8", "replace")}
+        )
+
+    async def close(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
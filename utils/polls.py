@@ -0,0 +1,258 @@
+import asyncio
+import time
+import typing as t
+from collections import Counter
+from datetime import datetime
+
+import discord
+
+BAR_LENGTH = 12
+
+
+class Poll:
+    """
+    A poll and its votes, tallied in memory as reactions come in.
+    With `single_vote`, a new vote of a user replaces their previous one.
+    """
+
+    def __init__(
+        self,
+        message_id: int,
+        channel_id: int,
+        author: str,
+        question: str,
+        options: t.List[t.Tuple[str, str]],
+        closes_at: t.Optional[datetime] = None,
+        single_vote: bool = True,
+        votes: t.Optional[t.Dict[int, t.List[str]]] = None,
+    ) -> None:
+        self.message_id = message_id
+        self.channel_id = channel_id
+        self.author = author
+        self.question = question
+        self.options = options
+        self.closes_at = closes_at
+        self.single_vote = single_vote
+        # user_id -> emojis they voted with, in order
+        self.votes: t.Dict[int, t.List[str]] = votes or {}
+        self.tally = Counter(
+            emoji for emojis in self.votes.values() for emoji in emojis
+        )
+
+        self.dirty = False
+        self.last_flush = 0.0
+        self.flusher: t.Optional[asyncio.Task] = None
+        self.closer: t.Optional[asyncio.Task] = None
+
+    def is_option(self, emoji: str) -> bool:
+        return any(option == emoji for option, _ in self.options)
+
+    def vote(self, user_id: int, emoji: str) -> t.Optional[str]:
+        """Count the vote of `user_id`. Return the emoji of the vote it replaced, if any."""
+        emojis = self.votes.setdefault(user_id, [])
+        if emoji in emojis:
+            return None
+        replaced = None
+        if self.single_vote and emojis:
+            replaced = emojis.pop()
+            self.tally[replaced] -= 1
+        emojis.append(emoji)
+        self.tally[emoji] += 1
+        return replaced
+
+    def unvote(self, user_id: int, emoji: str) -> bool:
+        """Take back the vote of `user_id`. Return False if there was no such vote."""
+        emojis = self.votes.get(user_id)
+        if not emojis or emoji not in emojis:
+            return False
+        emojis.remove(emoji)
+        self.tally[emoji] -= 1
+        if not emojis:
+            del self.votes[user_id]
+        return True
+
+    def render(self, closed: bool = False) -> discord.Embed:
+        total = sum(self.tally.values())
+        top = max(self.tally.values(), default=0)
+
+        lines = []
+        for emoji, content in self.options:
+            count = self.tally[emoji]
+            share = count / total if total else 0
+            bar = "█" * round(share * BAR_LENGTH)
+            line = f"{emoji}: {content}\n`{bar:<{BAR_LENGTH}}` {count} ({share:.0%})"
+            if closed and count and count == top:
+                line = f"**{line}**"
+            lines.append(line)
+
+        title = f"{self.author} asks: {self.question}"
+        embed = discord.Embed(
+            title=f"[Closed] {title}" if closed else title, color=0x7289DA
+        )
+        embed.add_field(name="\u200b", value="\n".join(lines))
+        if closed:
+            embed.set_footer(text=f"Final results, {total} votes")
+        elif self.closes_at:
+            embed.set_footer(text=f"{total} votes | Closes at")
+            embed.timestamp = self.closes_at
+        else:
+            embed.set_footer(text=f"{total} votes")
+        return embed
+
+    def to_document(self) -> dict:
+        return {
+            "message_id": self.message_id,
+            "channel_id": self.channel_id,
+            "author": self.author,
+            "question": self.question,
+            "options": [list(option) for option in self.options],
+            "closes_at": self.closes_at,
+            "single_vote": self.single_vote,
+            # Mongo keys have to be strings
+            "votes": {str(user_id): emojis for user_id, emojis in self.votes.items()},
+            "closed": False,
+        }
+
+    @classmethod
+    def from_document(cls, document: dict) -> "Poll":
+        return cls(
+            message_id=document["message_id"],
+            channel_id=document["channel_id"],
+            author=document["author"],
+            question=document["question"],
+            options=[tuple(option) for option in document["options"]],
+            closes_at=document["closes_at"],
+            single_vote=document["single_vote"],
+            votes={
+                int(user_id): emojis for user_id, emojis in document["votes"].items()
+            },
+        )
+
+
+class PollEngine:
+    """
+    Keeps the open polls in memory, counts votes from raw reaction events and closes polls when
+    they expire. Edits of a poll's message, along with saving it to the Mongo `collection`,
+    happen at most once per `edit_interval` seconds however fast the votes come in.
+    """
+
+    def __init__(self, bot, collection, edit_interval: float = 5.0) -> None:
+        self.bot = bot
+        self.collection = collection
+        self.edit_interval = edit_interval
+        # message_id -> open poll
+        self.polls: t.Dict[int, Poll] = {}
+
+    async def load(self) -> None:
+        """Load the open polls, and close those that expired while the bot was offline."""
+        # Their channels aren't cached before that
+        await self.bot.wait_until_ready()
+        async for document in self.collection.find({"closed": False}):
+            self._track(Poll.from_document(document))
+
+    def _track(self, poll: Poll) -> None:
+        self.polls[poll.message_id] = poll
+        if poll.closes_at is not None:
+            poll.closer = asyncio.create_task(self._close_later(poll))
+
+    async def start(self, poll: Poll) -> None:
+        await self.collection.insert_one(poll.to_document())
+        self._track(poll)
+
+    async def _message(self, poll: Poll) -> t.Optional[discord.PartialMessage]:
+        """Return the message of `poll`, None if its channel is gone."""
+        channel = self.bot.get_channel(poll.channel_id)
+        if channel is None:
+            try:
+                channel = await self.bot.fetch_channel(poll.channel_id)
+            except (discord.NotFound, discord.Forbidden):
+                return None
+        return channel.get_partial_message(poll.message_id)
+
+    async def on_reaction_add(self, payload: discord.RawReactionActionEvent) -> None:
+        poll = self.polls.get(payload.message_id)
+        emoji = str(payload.emoji)
+        if poll is None or payload.user_id == self.bot.user.id:
+            return
+        if not poll.is_option(emoji):
+            return
+
+        replaced = poll.vote(payload.user_id, emoji)
+        self._mark_dirty(poll)
+        if replaced is not None:
+            # One vote per user: take their previous reaction off, its removal event is a no-op
+            message = await self._message(poll)
+            if message is not None:
+                try:
+                    await message.remove_reaction(
+                        replaced, discord.Object(id=payload.user_id)
+                    )
+                except discord.HTTPException as e:
+                    print(e)
+
+    async def on_reaction_remove(self, payload: discord.RawReactionActionEvent) -> None:
+        poll = self.polls.get(payload.message_id)
+        if poll is not None and poll.unvote(payload.user_id, str(payload.emoji)):
+            self._mark_dirty(poll)
+
+    def _mark_dirty(self, poll: Poll) -> None:
+        poll.dirty = True
+        if poll.flusher is None:
+            poll.flusher = asyncio.create_task(self._flush(poll))
+
+    async def _flush(self, poll: Poll) -> None:
+        delay = poll.last_flush + self.edit_interval - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        poll.dirty = False
+        poll.last_flush = time.monotonic()
+        try:
+            await self._publish(poll)
+        except discord.HTTPException as e:
+            print(e)
+        finally:
+            poll.flusher = None
+        # Votes which came in while publishing go out with the next flush
+        if poll.dirty:
+            self._mark_dirty(poll)
+
+    async def _publish(self, poll: Poll, closed: bool = False) -> None:
+        """
+        Edit the message of `poll` and save it. Any error but the message being gone is raised
+        before saving, so a poll isn't stored as closed without its final results showing.
+        """
+        message = await self._message(poll)
+        if message is not None:
+            try:
+                await message.edit(embed=poll.render(closed))
+            except discord.NotFound:
+                pass  # Deleted, there's nothing left to update
+        document = poll.to_document()
+        document["closed"] = closed
+        await self.collection.replace_one({"message_id": poll.message_id}, document)
+
+    async def _close_later(self, poll: Poll) -> None:
+        delay = (poll.closes_at - datetime.utcnow()).total_seconds()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        await self.close(poll)
+
+    async def close(self, poll: Poll) -> None:
+        """Close `poll` and publish its final results, straight from the tally."""
+        self.polls.pop(poll.message_id, None)
+        if poll.flusher is not None:
+            poll.flusher.cancel()
+        if poll.closer is not None and poll.closer is not asyncio.current_task():
+            poll.closer.cancel()
+        try:
+            await self._publish(poll, closed=True)
+        except discord.HTTPException as e:
+            # Still open in the database, closing it is retried when the polls are next loaded
+            print(f"[ Log ] Could not close poll {poll.message_id}: {e}")
+
+    def cancel(self) -> None:
+        for poll in self.polls.values():
+            for task in (poll.flusher, poll.closer):
+                if task is not None:
+                    task.cancel()
@@ -0,0 +1,88 @@
+import typing as t
+
+import discord
+
+# Members with any of these roles may send any attachment
+ATTACHMENT_EXEMPT_ROLES = frozenset(
+    {
+        813670380707381249,
+        813668893272965130,
+        813669798499188746,
+        813669347511238687,
+    }
+)
+
+# Members with any of these roles may control anyone's paginators
+MODERATION_ROLES = frozenset(
+    {
+        790221089786822657,
+        795937707263000596,
+        790219985229709342,
+        794402650569310239,
+    }
+)
+
+
+class PrivilegeIndex:
+    """
+    The IDs of the members of every guild who have one of `role_ids`, so checking a member is
+    a set lookup.
+    The index is built per guild once the member cache is ready and kept up to date from
+    member and role events by the `Privileges` cog, for every index in `INDEXES`. Until a guild
+    is built, members are checked against their roles directly.
+    """
+
+    def __init__(self, role_ids: t.Iterable[int]) -> None:
+        self.role_ids = frozenset(role_ids)
+        self._members: t.Dict[int, t.Set[int]] = {}
+
+    def has_role(self, member: discord.Member) -> bool:
+        return any(role.id in self.role_ids for role in member.roles)
+
+    def build(self, guild: discord.Guild) -> None:
+        self._members[guild.id] = {
+            member.id for member in guild.members if self.has_role(member)
+        }
+
+    def forget(self, guild: discord.Guild) -> None:
+        self._members.pop(guild.id, None)
+
+    def update(self, member: discord.Member) -> None:
+        """Add `member` to or remove them from the index of their guild after a role change."""
+        members = self._members.get(member.guild.id)
+        if members is None:
+            return
+        if self.has_role(member):
+            members.add(member.id)
+        else:
+            members.discard(member.id)
+
+    def remove(self, member: discord.Member) -> None:
+        members = self._members.get(member.guild.id)
+        if members is not None:
+            members.discard(member.id)
+
+    def includes(self, member: t.Union[discord.Member, discord.User]) -> bool:
+        # Users outside of a guild (in DMs for example) have no roles at all
+        if not isinstance(member, discord.Member):
+            return False
+        members = self._members.get(member.guild.id)
+        if members is None:
+            return self.has_role(member)
+        return member.id in members
+
+
+attachment_exempt = PrivilegeIndex(ATTACHMENT_EXEMPT_ROLES)
+moderators = PrivilegeIndex(MODERATION_ROLES)
+
+INDEXES = (attachment_exempt, moderators)
+
+
+def is_attachment_exempt(member: t.Union[discord.Member, discord.User]) -> bool:
+    """Return whether `member` may send attachments the filter would otherwise delete."""
+    return attachment_exempt.includes(member)
+
+
+def is_moderator(member: t.Union[discord.Member, discord.User]) -> bool:
+    """Return whether `member` has a moderation role in the guild they belong to."""
+    return moderators.includes(member)
@@ -0,0 +1,154 @@
+import re
+import typing as t
+
+import discord
+
+CUSTOM_EMOJI_REGEX = re.compile(r"<a?:\w+:(\d+)>")
+
+# The menus which were hardcoded before the registry, stored on first load so they keep working
+DEFAULT_MENUS = [
+    {
+        "message_id": 820236163960668210,
+        "channel_id": None,
+        "title": "Reaction Roles",
+        "description": "",
+        "entries": [
+            {
+                "emoji": "<:windows:819940534751199252>",
+                "role_id": 819939970869231666,
+                "label": "Windows",
+                "section": "Operating System",
+                "removable": True,
+            },
+            {
+                "emoji": "<:linux:819940542283644988>",
+                "role_id": 819940076090949642,
+                "label": "Linux/ Unix",
+                "section": "Operating System",
+                "removable": True,
+            },
+            {
+                "emoji": "<:announcement:820155872914833459>",
+                "role_id": 819770725170675722,
+                "label": "Announcement",
+                "section": "Notification Roles",
+                "removable": True,
+            },
+            {
+                "emoji": "<:chat_revive:820145356209389590>",
+                "role_id": 820127343901278219,
+                "label": "Chat Revive",
+                "section": "Notification Roles",
+                "removable": True,
+            },
+        ],
+    },
+    {
+        "message_id": 820236203726077992,
+        "channel_id": None,
+        "title": "Welcome to PyVerse",
+        "description": "Before getting started please react with <:yes:820156388130160670> "
+        "to get access to rest of the channels",
+        "entries": [
+            {
+                "emoji": "<:yes:820156388130160670>",
+                "role_id": 813668832047661076,
+                "label": "",
+                "section": "",
+                # Verification can't be undone by removing the reaction
+                "removable": False,
+            },
+        ],
+    },
+]
+
+
+def emoji_key(emoji: t.Union[str, discord.PartialEmoji, discord.Emoji]) -> str:
+    """
+    Return the key of `emoji` in the registry: the ID of custom emojis, the emoji itself otherwise.
+    Accepts the `<:name:id>` form, emoji objects and the `payload.emoji` of raw reaction events.
+    """
+    if isinstance(emoji, str):
+        match = CUSTOM_EMOJI_REGEX.fullmatch(emoji.strip())
+        return match[1] if match else emoji.strip()
+    return str(emoji.id) if emoji.id else emoji.name
+
+
+class ReactionRoleRegistry:
+    """
+    Role menus, indexed by `(message_id, emoji_key)` for constant time lookups from reactions.
+    Menus are stored in the Mongo `collection` as documents shaped like `DEFAULT_MENUS`. The index
+    is rebuilt whenever a menu changes, and can be reloaded from the database at any time.
+    """
+
+    def __init__(self, collection) -> None:
+        self.collection = collection
+        # message_id -> menu document
+        self.menus: t.Dict[int, dict] = {}
+        # (message_id, emoji_key) -> entry
+        self._entries: t.Dict[t.Tuple[int, str], dict] = {}
+
+    def _index(self, menus: t.Iterable[dict]) -> None:
+        menus = {menu["message_id"]: menu for menu in menus}
+        entries = {
+            (message_id, emoji_key(entry["emoji"])): entry
+            for message_id, menu in menus.items()
+            for entry in menu["entries"]
+        }
+        self.menus, self._entries = menus, entries
+
+    async def load(self) -> None:
+        menus = await self.collection.find({}, {"_id": False}).to_list(length=None)
+        if not menus:
+            await self.collection.insert_many([dict(menu) for menu in DEFAULT_MENUS])
+            menus = DEFAULT_MENUS
+        self._index(menus)
+
+    def get(
+        self, message_id: int, emoji: t.Union[str, discord.PartialEmoji]
+    ) -> t.Optional[dict]:
+        """Return the entry for `emoji` on the menu `message_id`, if there is one."""
+        return self._entries.get((message_id, emoji_key(emoji)))
+
+    def is_menu(self, message_id: int) -> bool:
+        return message_id in self.menus
+
+    async def save(self, menu: dict) -> None:
+        """Store `menu`, created or updated, and make it effective right away."""
+        await self.collection.replace_one(
+            {"message_id": menu["message_id"]}, menu, upsert=True
+        )
+        self._index([*self.menus.values(), menu])
+
+    async def delete(self, message_id: int) -> None:
+        await self.collection.delete_one({"message_id": message_id})
+        self._index(m for m in self.menus.values() if m["message_id"] != message_id)
+
+    async def move(self, menu: dict, message: discord.Message) -> None:
+        """Make `menu` point to `message`, which it was (re)sent as."""
+        old_id = menu["message_id"]
+        menu = {**menu, "message_id": message.id, "channel_id": message.channel.id}
+        await self.collection.replace_one({"message_id": old_id}, menu, upsert=True)
+        self._index(
+            [m for m in self.menus.values() if m["message_id"] != old_id] + [menu]
+        )
+
+
+def render_menu(menu: dict) -> discord.Embed:
+    """Build the embed of `menu`, listing its labelled entries grouped by section."""
+    sections: t.Dict[str, t.List[str]] = {}
+    for entry in menu["entries"]:
+        if entry.get("label"):
+            sections.setdefault(entry.get("section", ""), []).append(
+                f"{entry['emoji']} {entry['label']}"
+            )
+
+    parts = [menu["description"]] if menu.get("description") else []
+    for section, lines in sections.items():
+        if section:
+            parts.append(f"**{section}:**")
+        parts.extend(lines)
+
+    embed = discord.Embed(color=0x7289DA)
+    embed.add_field(name=menu["title"], value="\n\n".join(parts) or "No roles yet.")
+    return embed
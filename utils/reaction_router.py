@@ -0,0 +1,110 @@
+import asyncio
+import heapq
+import itertools
+import time
+import typing as t
+
+import discord
+from discord.ext.commands import Bot
+
+Check = t.Callable[[discord.Reaction, discord.User], bool]
+
+
+class ReactionSession:
+    """The reactions routed to one message, waited for like `bot.wait_for("reaction_add")`."""
+
+    def __init__(self, router: "ReactionRouter", message_id: int, check: Check) -> None:
+        self.router = router
+        self.message_id = message_id
+        self.check = check
+        self.deadline = float("inf")
+        self._queue: asyncio.Queue = asyncio.Queue()
+
+    async def wait(
+        self, timeout: float
+    ) -> t.Tuple[discord.Reaction, t.Union[discord.Member, discord.User]]:
+        """
+        Return the next reaction passing the check and its user.
+        Raise `asyncio.TimeoutError` if none came in `timeout` seconds.
+        """
+        if self._queue.empty():
+            self.router._set_deadline(self, time.monotonic() + timeout)
+        item = await self._queue.get()
+        if item is None:
+            raise asyncio.TimeoutError()
+        return item
+
+    def close(self) -> None:
+        self.router.unregister(self)
+
+
+class ReactionRouter:
+    """
+    A single `on_reaction_add` listener routing reactions to the session of their message.
+    Finding the session is a dict lookup and only its check runs, so the cost of a reaction doesn't
+    grow with the number of open sessions. Timeouts of every session are handled by one task
+    sleeping until the earliest deadline of a shared heap.
+    """
+
+    def __init__(self, bot: Bot) -> None:
+        self.bot = bot
+        # message_id -> session
+        self.sessions: t.Dict[int, ReactionSession] = {}
+        # (deadline, tie breaker, session); stale entries are skipped when they come up
+        self._deadlines: t.List[t.Tuple[float, int, ReactionSession]] = []
+        self._sequence = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._expirer: t.Optional[asyncio.Task] = None
+        bot.add_listener(self.on_reaction_add, "on_reaction_add")
+
+    def register(self, message: discord.Message, check: Check) -> ReactionSession:
+        session = ReactionSession(self, message.id, check)
+        self.sessions[message.id] = session
+        return session
+
+    def unregister(self, session: ReactionSession) -> None:
+        if self.sessions.get(session.message_id) is session:
+            del self.sessions[session.message_id]
+
+    async def on_reaction_add(
+        self, reaction: discord.Reaction, user: t.Union[discord.Member, discord.User]
+    ) -> None:
+        session = self.sessions.get(reaction.message.id)
+        if session is not None and session.check(reaction, user):
+            session.deadline = float("inf")
+            session._queue.put_nowait((reaction, user))
+
+    def _set_deadline(self, session: ReactionSession, deadline: float) -> None:
+        session.deadline = deadline
+        earliest = self._deadlines[0][0] if self._deadlines else float("inf")
+        heapq.heappush(self._deadlines, (deadline, next(self._sequence), session))
+        if self._expirer is None or self._expirer.done():
+            self._expirer = asyncio.create_task(self._expire())
+        elif deadline < earliest:
+            self._wakeup.set()
+
+    async def _expire(self) -> None:
+        while self._deadlines:
+            delay = self._deadlines[0][0] - time.monotonic()
+            if delay > 0:
+                self._wakeup.clear()
+                try:
+                    # Woken up early when a session with a closer deadline comes in
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            deadline, _, session = heapq.heappop(self._deadlines)
+            # The session may have got a reaction, and a later deadline, since this was pushed
+            if session.deadline == deadline and session.message_id in self.sessions:
+                session.deadline = float("inf")
+                session._queue.put_nowait(None)
+
+
+def get_router(bot: Bot) -> ReactionRouter:
+    """Return the reaction router of `bot`, creating it on first use."""
+    router = getattr(bot, "reaction_router", None)
+    if router is None:
+        router = bot.reaction_router = ReactionRouter(bot)
+    return router
@@ -0,0 +1,171 @@
+import asyncio
+import time
+import typing as t
+
+import discord
+
+# After an edit, the member cache only catches up once the gateway sends the update, so the
+# changes which were just applied are laid over the cached roles for this long. Members that
+# callers fetched are as stale as the cache, so this has to outlive any cache of fetched
+# members too, reaction_roles only coalesces in-flight fetches and keeps none of them
+APPLIED_TTL = 10
+
+
+class _Batch:
+    __slots__ = ("member", "changes", "handle")
+
+    def __init__(self, member: discord.Member) -> None:
+        self.member = member
+        # role_id -> True to add the role, False to remove it; the last click wins
+        self.changes: t.Dict[int, bool] = {}
+        self.handle: t.Optional[asyncio.TimerHandle] = None
+
+
+class RoleBatcher:
+    """
+    Coalesce the role changes of a member into a single `member.edit(roles=...)`.
+    Changes are collected per member until none came in for `window` seconds, then the member
+    is queued for one of `workers` workers, which applies the net change in one request. Edits
+    of the same member never run concurrently. When Discord rate limits an edit, every worker
+    pauses until the limit resets and the edit is retried.
+    """
+
+    def __init__(self, window: float = 1.0, workers: int = 4) -> None:
+        self.window = window
+        self.worker_count = workers
+
+        self._queue: t.Optional[asyncio.Queue] = None
+        self._workers: t.List[asyncio.Task] = []
+        # (guild_id, member_id) -> changes waiting for the window to close
+        self._batches: t.Dict[t.Tuple[int, int], _Batch] = {}
+        # Members being edited right now
+        self._active: t.Set[t.Tuple[int, int]] = set()
+        # (guild_id, member_id) -> (changes applied by the last edits, when)
+        self._applied: t.Dict[t.Tuple[int, int], t.Tuple[t.Dict[int, bool], float]] = {}
+        self._resume_at = 0.0
+
+    def _start(self) -> None:
+        # Created on first use, the queue needs the running loop
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+            self._workers = [
+                asyncio.create_task(self._work()) for _ in range(self.worker_count)
+            ]
+
+    def _schedule(self, key: t.Tuple[int, int], batch: _Batch, delay: float) -> None:
+        if batch.handle is not None:
+            batch.handle.cancel()
+        loop = asyncio.get_running_loop()
+        batch.handle = loop.call_later(delay, self._ready, key)
+
+    def change(self, member: discord.Member, role_id: int, add: bool) -> None:
+        """Queue adding (or removing) the role `role_id` to (from) `member`."""
+        self._start()
+        key = (member.guild.id, member.id)
+        batch = self._batches.get(key)
+        if batch is None:
+            batch = self._batches[key] = _Batch(member)
+        batch.member = member
+        batch.changes[role_id] = add
+        # Debounced: every click pushes the edit back, a burst of clicks ends in one request
+        self._schedule(key, batch, self.window)
+
+    def _ready(self, key: t.Tuple[int, int]) -> None:
+        batch = self._batches.get(key)
+        if batch is None:
+            return
+        if key in self._active:
+            # Let the running edit finish first, so the two don't overwrite each other
+            self._schedule(key, batch, self.window)
+            return
+        batch.handle = None
+        del self._batches[key]
+        self._active.add(key)
+        self._queue.put_nowait((key, batch))
+
+    def _recent_changes(self, key: t.Tuple[int, int]) -> t.Dict[int, bool]:
+        applied = self._applied.get(key)
+        if applied is not None and time.monotonic() - applied[1] < APPLIED_TTL:
+            return applied[0]
+        return {}
+
+    def _current_roles(
+        self, key: t.Tuple[int, int], member: discord.Member
+    ) -> t.Set[int]:
+        # Prefer the cached member, it's updated by the gateway while batches wait
+        member = member.guild.get_member(member.id) or member
+        roles = {role.id for role in member.roles if not role.is_default()}
+        # Only what this batcher changed is laid over the cache, so roles given or taken by
+        # anyone else in the meantime are kept as they are
+        for role_id, add in self._recent_changes(key).items():
+            if add:
+                roles.add(role_id)
+            else:
+                roles.discard(role_id)
+        return roles
+
+    async def _apply(self, key: t.Tuple[int, int], batch: _Batch) -> None:
+        current = self._current_roles(key, batch.member)
+        roles = set(current)
+        for role_id, add in batch.changes.items():
+            if add:
+                roles.add(role_id)
+            else:
+                roles.discard(role_id)
+        if roles == current:
+            return  # The clicks cancelled out
+
+        await batch.member.edit(roles=[discord.Object(id=role_id) for role_id in roles])
+        self._applied[key] = (
+            {**self._recent_changes(key), **batch.changes},
+            time.monotonic(),
+        )
+
+    async def _work(self) -> None:
+        while True:
+            key, batch = await self._queue.get()
+            retry = False
+            try:
+                delay = self._resume_at - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                await self._apply(key, batch)
+            except discord.HTTPException as e:
+                if e.status == 429:
+                    # discord.py gave up retrying, hold every worker back and try again later
+                    retry_after = float(e.response.headers.get("Retry-After", 5))
+                    self._resume_at = max(
+                        self._resume_at, time.monotonic() + retry_after
+                    )
+                    retry = True
+                elif e.status != 404:  # The member left
+                    print(e)
+            except Exception as e:
+                print(e)
+            finally:
+                self._queue.task_done()
+
+            if retry:
+                self._queue.put_nowait((key, batch))
+            else:
+                self._active.discard(key)
+                self._prune()
+
+    async def drain(self) -> None:
+        """Wait until every queued change has been applied."""
+        while self._batches or self._active:
+            await asyncio.sleep(self.window / 2)
+
+    def _prune(self) -> None:
+        now = time.monotonic()
+        for key in [
+            k for k, (_, at) in self._applied.items() if now - at >= APPLIED_TTL
+        ]:
+            del self._applied[key]
+
+    def close(self) -> None:
+        for batch in self._batches.values():
+            if batch.handle is not None:
+                batch.handle.cancel()
+        for worker in self._workers:
+            worker.cancel()
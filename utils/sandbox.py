@@ -0,0 +1,138 @@
+import asyncio
+import time
+import typing as t
+from collections import deque
+from statistics import mean
+
+import aiohttp
+
+PROBE_CODE = "print('ok')"
+
+
+class Backend:
+    """A single snekbox endpoint together with its load and health statistics."""
+
+    def __init__(self, url: str) -> None:
+        self.url = url.rstrip("/")
+        self.healthy = True
+        self.in_flight = 0
+        self.requests = 0
+        self.errors = 0
+        self.consecutive_errors = 0
+        self.last_error = None
+        # Seconds taken by the most recent successful evals
+        self.latencies = deque(maxlen=100)
+
+    @property
+    def average_latency(self) -> float:
+        return mean(self.latencies) if self.latencies else 0.0
+
+    @property
+    def p95_latency(self) -> float:
+        if not self.latencies:
+            return 0.0
+        latencies = sorted(self.latencies)
+        return latencies[int(0.95 * (len(latencies) - 1))]
+
+    def record_success(self, latency: float) -> None:
+        self.latencies.append(latency)
+        self.consecutive_errors = 0
+
+    def record_error(self, error: Exception) -> None:
+        self.errors += 1
+        self.consecutive_errors += 1
+        self.last_error = f"{type(error).__name__}: {error}"
+
+    def __repr__(self) -> str:
+        return f"<Backend url={self.url!r} healthy={self.healthy} in_flight={self.in_flight}>"
+
+
+class BackendPool:
+    """
+    Route evals to the least-loaded healthy snekbox out of several.
+    A backend is ejected after `max_errors` consecutive failures, or when a health probe fails or
+    takes longer than `slow_threshold` seconds; the next successful probe brings it back. Evals
+    which fail to connect are retried once on every other backend before giving up.
+    """
+
+    def __init__(
+        self,
+        urls: t.Iterable[str],
+        max_errors: int = 3,
+        slow_threshold: float = 5.0,
+    ) -> None:
+        self.backends = [Backend(url) for url in urls]
+        if not self.backends:
+            raise ValueError("At least one snekbox backend is required.")
+
+        self.max_errors = max_errors
+        self.slow_threshold = slow_threshold
+
+    def __len__(self) -> int:
+        return len(self.backends)
+
+    def pick(self, exclude: t.Collection[Backend] = ()) -> t.Optional[Backend]:
+        """Return the healthy backend with the fewest evals in flight, or None if all are excluded."""
+        candidates = [backend for backend in self.backends if backend not in exclude]
+        # Rather try an ejected backend than fail outright when none is healthy
+        healthy = [backend for backend in candidates if backend.healthy] or candidates
+        if not healthy:
+            return None
+        return min(healthy, key=lambda b: (b.in_flight, b.average_latency))
+
+    async def post_eval(self, session: aiohttp.ClientSession, code: str) -> dict:
+        """Run `code` on the best backend, failing over to the others on connection errors."""
+        tried, error = [], None
+        while (backend := self.pick(exclude=tried)) is not None:
+            tried.append(backend)
+            try:
+                return await self._post(session, backend, code)
+            except aiohttp.ClientConnectionError as e:
+                backend.healthy = False
+                error = e
+
+        raise error
+
+    async def _post(
+        self, session: aiohttp.ClientSession, backend: Backend, code: str
+    ) -> dict:
+        backend.in_flight += 1
+        backend.requests += 1
+        start = time.perf_counter()
+        try:
+            async with session.post(
+                f"{backend.url}/eval", json={"input": code}, raise_for_status=True
+            ) as resp:
+                results = await resp.json()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            backend.record_error(e)
+            if backend.consecutive_errors >= self.max_errors:
+                backend.healthy = False
+            raise
+        finally:
+            backend.in_flight -= 1
+
+        backend.record_success(time.perf_counter() - start)
+        return results
+
+    async def probe(self, session: aiohttp.ClientSession) -> None:
+        """Run a tiny eval on every backend at once, ejecting failing or slow ones."""
+        await asyncio.gather(*(self._probe(session, b) for b in self.backends))
+
+    async def _probe(self, session: aiohttp.ClientSession, backend: Backend) -> None:
+        start = time.perf_counter()
+        try:
+            async with session.post(
+                f"{backend.url}/eval",
+                json={"input": PROBE_CODE},
+                raise_for_status=True,
+                timeout=aiohttp.ClientTimeout(total=self.slow_threshold),
+            ) as resp:
+                await resp.json()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            backend.record_error(e)
+            backend.healthy = False
+            return
+
+        backend.consecutive_errors = 0
+        backend.healthy = time.perf_counter() - start < self.slow_threshold
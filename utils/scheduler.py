@@ -0,0 +1,133 @@
+import asyncio
+import time
+import typing as t
+from collections import OrderedDict, deque
+
+
+class Job:
+    """A unit of work queued on a `FairScheduler`, with the timings needed to report latency."""
+
+    __slots__ = (
+        "owner",
+        "factory",
+        "future",
+        "enqueued_at",
+        "started_at",
+        "finished_at",
+    )
+
+    def __init__(self, owner: int, factory: t.Callable[[], t.Awaitable]) -> None:
+        self.owner = owner
+        self.factory = factory
+        self.future = asyncio.get_event_loop().create_future()
+        self.enqueued_at = time.perf_counter()
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def queue_wait(self) -> float:
+        """Seconds spent waiting for a worker."""
+        return (self.started_at or time.perf_counter()) - self.enqueued_at
+
+    @property
+    def run_time(self) -> float:
+        """Seconds spent running, once a worker picked the job up."""
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.perf_counter()) - self.started_at
+
+    def __await__(self):
+        return self.future.__await__()
+
+
+class FairScheduler:
+    """
+    Bounded worker pool which serves its owners (users) round-robin.
+    Each owner has their own FIFO queue, and the workers take one job from each owner with pending
+    work in turn, so somebody submitting a burst of jobs can't starve everyone else. At most
+    `workers` jobs run at the same time.
+    """
+
+    def __init__(self, workers: int = 2) -> None:
+        self.workers = workers
+        # owner -> pending jobs, in the order owners get served
+        self._queues: t.OrderedDict[int, deque] = OrderedDict()
+        self._available = None  # Counts queued jobs, created with the workers
+        self._tasks: t.List[asyncio.Task] = []
+        self.running = 0
+
+    def __len__(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    def submit(self, owner: int, factory: t.Callable[[], t.Awaitable]) -> Job:
+        """Queue `factory()` to be run for `owner`; await the returned job for its result."""
+        if not self._tasks:
+            self._available = asyncio.Semaphore(0)
+            self._tasks = [
+                asyncio.create_task(self._worker()) for _ in range(self.workers)
+            ]
+
+        job = Job(owner, factory)
+        self._queues.setdefault(owner, deque()).append(job)
+        self._available.release()
+        return job
+
+    def position(self, job: Job) -> int:
+        """
+        Return the place of `job` in the queue (1 is next up), or 0 if it is not queued anymore.
+        This walks the round-robin order, so it is only meant for the small queues we keep.
+        """
+        queues = [list(queue) for queue in self._queues.values()]
+        position = 0
+        for depth in range(max(map(len, queues), default=0)):
+            for queue in queues:
+                if depth < len(queue):
+                    if queue[depth] is job:
+                        return position + 1
+                    position += 1
+        return 0
+
+    def _next(self) -> t.Optional[Job]:
+        """Pop the next job, moving its owner to the back of the rotation."""
+        if not self._queues:
+            return None
+
+        owner, queue = self._queues.popitem(last=False)
+        job = queue.popleft()
+        if queue:
+            self._queues[owner] = queue
+        return job
+
+    async def _worker(self) -> None:
+        while True:
+            await self._available.acquire()
+            job = self._next()
+            if job is None or job.future.cancelled():
+                continue
+
+            job.started_at = time.perf_counter()
+            self.running += 1
+            try:
+                result = await job.factory()
+            except asyncio.CancelledError:
+                job.future.cancel()
+                raise
+            except Exception as e:
+                if not job.future.done():
+                    job.future.set_exception(e)
+            else:
+                if not job.future.done():
+                    job.future.set_result(result)
+            finally:
+                job.finished_at = time.perf_counter()
+                self.running -= 1
+
+    def close(self) -> None:
+        """Stop the workers and cancel every pending job."""
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        for queue in self._queues.values():
+            for job in queue:
+                job.future.cancel()
+        self._queues.clear()